@@ -0,0 +1,66 @@
+"""Stress test and lookup throughput of SharedRedBlackTree under a concurrent writer.
+
+The writer inserts whole blocks of BLOCK consecutive keys and deletes the
+oldest block in the same batch. Every snapshot a reader takes must therefore
+consist of whole blocks; a torn batch fails the run.
+"""
+from argparse import ArgumentParser
+import random
+import threading
+import time
+from shared import SharedRedBlackTree
+
+BLOCK = 64
+
+def writer(shared: SharedRedBlackTree, blocks: int, stop: threading.Event, batches: list):
+    block = blocks
+    while not stop.is_set():
+        inserts = range(block * BLOCK, (block + 1) * BLOCK)
+        deletes = range((block - blocks) * BLOCK, (block - blocks + 1) * BLOCK)
+        shared.apply(inserts=inserts, deletes=deletes)
+        batches[0] += 1
+        block += 1
+
+def reader(shared: SharedRedBlackTree, seed: int, stop: threading.Event, counts: list, errors: list):
+    rng, lookups = random.Random(seed), 0
+    while not stop.is_set():
+        snapshot = shared.snapshot()
+        keys = list(snapshot) if lookups % 5000 == 0 else None
+        if keys is not None and (len(keys) % BLOCK or keys[0] % BLOCK
+                                 or keys[-1] - keys[0] != len(keys) - 1):
+            errors.append(f'torn snapshot of {len(keys)} keys from {keys[0]}')
+        first = next(iter(snapshot)) // BLOCK
+        block = first + rng.randrange(len(snapshot) // BLOCK)
+        hits = sum(key in snapshot for key in (block * BLOCK, block * BLOCK + BLOCK - 1))
+        if hits != 2:
+            errors.append(f'block {block} is partly missing')
+        lookups += 2
+    counts.append(lookups)
+
+def run(readers: int, blocks: int, seconds: float) -> tuple[float, int, list]:
+    shared = SharedRedBlackTree(range(blocks * BLOCK))
+    stop, counts, errors, batches = threading.Event(), [], [], [0]
+    threads = [threading.Thread(target=writer, args=(shared, blocks, stop, batches))]
+    threads += [threading.Thread(target=reader, args=(shared, seed, stop, counts, errors))
+                for seed in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return sum(counts) / seconds, batches[0], errors
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--readers', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--blocks', type=int, default=1000)
+    parser.add_argument('--seconds', type=float, default=3)
+    args = parser.parse_args()
+
+    for readers in args.readers:
+        rate, batches, errors = run(readers, args.blocks, args.seconds)
+        print(f'{readers:>3} readers: {rate:12,.0f} lookups/s, {batches / args.seconds:8,.0f} '
+              f'write batches/s, {len(errors)} consistency errors')
+        for error in errors[:5]:
+            print('   ', error)
@@ -0,0 +1,168 @@
+"""Throughput and invariant check of RedBlackTree against a sorted list and a dict.
+
+Workloads insert random keys, ascending and descending runs, and clustered
+runs of consecutive keys (timestamps of a few sources). The tree runs
+validate() and is compared with the expected keys three times: after the
+inserts, after deleting half of the keys at random, and after an
+insert_from / delete_from round trip of the deleted half. Any violation
+fails the run. The baselines are a bisect.insort list, skipped above
+--bisect-rows as it moves O(n) keys per insert, and a dict, which keeps no
+order. Each case gets a fresh worker process, so ru_maxrss is its own.
+"""
+from argparse import ArgumentParser
+from bisect import bisect_left, insort
+import json
+import multiprocessing
+import platform
+import random
+import resource
+import time
+
+WORKLOADS = ['random', 'sorted', 'reverse', 'clustered']
+STRUCTURES = ['rbt', 'bisect', 'dict']
+
+def workload_keys(name: str, rows: int, seed: int = 42) -> list[int]:
+    """Keys in insertion order"""
+    rng = random.Random(seed)
+    if name == 'random':
+        return rng.sample(range(10 * rows), rows)
+    elif name == 'sorted':
+        return list(range(rows))
+    elif name == 'reverse':
+        return list(range(rows - 1, -1, -1))
+    clusters = max(1, rows // 1000)
+    starts = rng.sample(range(0, 100 * rows, 100 * rows // clusters), clusters)
+    return [start + offset for start in starts for offset in range(rows // clusters)] \
+        + list(range(100 * rows, 100 * rows + rows % clusters))
+
+class SortedList:
+    """bisect baseline with the operations of the tree"""
+    def __init__(self):
+        self.keys = []
+
+    def insert(self, key: int):
+        insort(self.keys, key)
+
+    def search(self, key: int) -> bool:
+        index = bisect_left(self.keys, key)
+        return index < len(self.keys) and self.keys[index] == key
+
+    def delete(self, key: int):
+        del self.keys[bisect_left(self.keys, key)]
+
+class Dict:
+    """Unordered hash baseline"""
+    def __init__(self):
+        self.keys = {}
+
+    def insert(self, key: int):
+        self.keys[key] = None
+
+    def search(self, key: int) -> bool:
+        return key in self.keys
+
+    def delete(self, key: int):
+        del self.keys[key]
+
+def rss_mb() -> float:
+    """Peak resident memory of this process, ru_maxrss is in KB on Linux"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10
+
+def violation(tree, expected: list[int]) -> str | None:
+    try:
+        tree.validate()
+    except AssertionError as error:
+        return str(error)
+    if list(tree) != expected:
+        return 'keys differ from the expected ones'
+
+def height(tree) -> int:
+    levels, level = 0, [tree.root] if tree else []
+    while level:
+        levels += 1
+        level = [child for node in level for child in (node.left, node.right) if child]
+    return levels
+
+def rate(operation, keys: list[int]) -> float:
+    """Operations per second of operation over keys"""
+    start = time.perf_counter()
+    for key in keys:
+        operation(key)
+    return len(keys) / (time.perf_counter() - start)
+
+def run_case(case: dict) -> dict:
+    from redblacktree import RedBlackTree
+
+    keys = workload_keys(case['workload'], case['rows'])
+    lookups = random.Random(0).sample(keys, len(keys))
+    deleted, kept = lookups[:len(keys) // 2], sorted(lookups[len(keys) // 2:])
+    structure = {'rbt': RedBlackTree, 'bisect': SortedList, 'dict': Dict}[case['structure']]()
+    is_tree = case['structure'] == 'rbt'
+    result = dict(case, data_rss_mb=rss_mb(), errors=[])
+
+    result['insert_ops'] = rate(structure.insert, keys)
+    result['insert_rss_mb'] = rss_mb()
+    if is_tree:
+        result['height'] = height(structure)
+        result['errors'].append(violation(structure, sorted(keys)))
+    result['search_ops'] = rate(structure.search, lookups)
+    if case['layout']:
+        # the second layout redraws the tree with one new key
+        for phase, change in [('layout_seconds', structure.insert), ('relayout_seconds', structure.delete)]:
+            start = time.perf_counter()
+            structure.layout()
+            result[phase] = time.perf_counter() - start
+            change(-1)
+    result['delete_ops'] = rate(structure.delete, deleted)
+    if is_tree:
+        result['errors'].append(violation(structure, kept))
+        for operation in [structure.insert_from, structure.delete_from]:
+            start = time.perf_counter()
+            operation(deleted)
+            result[f'{operation.__name__}_seconds'] = time.perf_counter() - start
+        result['errors'].append(violation(structure, kept))
+    result['errors'] = [error for error in result['errors'] if error]
+    result['peak_rss_mb'] = rss_mb()
+    return result
+
+def name(case: dict) -> str:
+    return f"{case['workload']} {case['rows']} {case['structure']}"
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--workloads', nargs='+', default=WORKLOADS, choices=WORKLOADS)
+    parser.add_argument('--sizes', nargs='+', type=int, default=[10**3, 10**4, 10**5, 10**6])
+    parser.add_argument('--structures', nargs='+', default=STRUCTURES, choices=STRUCTURES)
+    parser.add_argument('--bisect-rows', type=int, default=10**5)
+    parser.add_argument('--layout-rows', type=int, default=10**5,
+                        help='largest tree whose layout() is timed')
+    parser.add_argument('--output', default='benchmark.json')
+    parser.add_argument('--compare', default=None, help='JSON of an earlier run')
+    args = parser.parse_args()
+
+    cases = [dict(workload=workload, rows=rows, structure=structure,
+                  layout=structure == 'rbt' and rows <= args.layout_rows)
+             for workload in args.workloads for rows in args.sizes for structure in args.structures
+             if structure != 'bisect' or rows <= args.bisect_rows]
+    # one task per worker, a new process starts with the RSS of a bare interpreter
+    with multiprocessing.get_context('spawn').Pool(1, maxtasksperchild=1) as pool:
+        results = []
+        for result in pool.imap(run_case, cases):
+            results.append(result)
+            print(name(result), *[f"{phase} {result[f'{phase}_ops']:,.0f}/s"
+                                  for phase in ['insert', 'search', 'delete']],
+                  f"peak {result['peak_rss_mb']:.0f} MB", *result['errors'], flush=True)
+
+    with open(args.output, 'w') as file:
+        json.dump(dict(python=platform.python_version(), machine=platform.machine(),
+                       results=sorted(results, key=name)), file, indent=1)
+    if args.compare:
+        with open(args.compare) as file:
+            before = {name(result): result for result in json.load(file)['results']}
+        for result in results:
+            if name(result) in before:
+                print(name(result), *[
+                    f"{phase} x{result[f'{phase}_ops'] / before[name(result)][f'{phase}_ops']:.2f}"
+                    for phase in ['insert', 'search', 'delete']])
+    if any(result['errors'] for result in results):
+        raise SystemExit('Red-black tree invariants are broken')
@@ -2,7 +2,10 @@ from redblacktree import RedBlackTree
 import matplotlib.pyplot as plt
 import streamlit as st
 import networkx as nx
-import time
+from itertools import islice
+
+MAX_SHOWN_VALUES = 200
+MAX_WINDOW_DEPTH = 8
 
 st.set_page_config(
     page_title="RedBlackTree",
@@ -14,9 +17,6 @@ session = st.session_state
 if 'tree' not in session:
     session.tree = RedBlackTree()
 
-if 'inserted_values' not in session:
-    session.inserted_values = []
-
 if 'session_iteration' not in session:
     session.session_iteration = 0
 
@@ -62,6 +62,17 @@ figsize = sidebar.slider(
     min_value=3,
     max_value=120
 )
+whole_tree = sidebar.toggle(label='🌳Всё дерево', value=False)
+focus = sidebar.text_input(label='🎯Корень окна:', key='focus_field', placeholder='Пример: 34 (пусто — корень)')
+depth = sidebar.slider(label='📏Глубина окна', min_value=1, max_value=MAX_WINDOW_DEPTH, value=4)
+range_field = sidebar.text_input(label='↔️Диапазон ключей:', key='range_field', placeholder='Пример: 10 50')
+show_stats = sidebar.toggle(label='📊Статистика операций', value=False)
+
+# счётчики включаются только по запросу, без них дерево работает без накладных расходов
+if show_stats and session.tree.stats is None:
+    session.tree.enable_stats()
+elif not show_stats:
+    session.tree.disable_stats()
 
 if session.insert_button:
     try:
@@ -76,7 +87,6 @@ if session.insert_button:
     for value in new_values:
         try:
             session.tree.insert(value)
-            session.inserted_values.append(value)
             correct_values.append(value)
         except ValueError:
             wrong_values.append(value)
@@ -98,7 +108,6 @@ if session.delete_button:
     for value in values2delete:
         try:
             session.tree.delete(value)
-            session.inserted_values.remove(value)
             correct_values.append(value)
         except ValueError:
             wrong_values.append(value)
@@ -107,13 +116,45 @@ if session.delete_button:
     if wrong_values:
         st.warning(f'Не удалено: {wrong_values}', icon='⚠️')
 
-if session.inserted_values:
-    with st.spinner('Загрузка...'):
-        time.sleep(2)
-    st.subheader(f'👽Вставленные значения: {sorted(session.inserted_values)}')
-    tree = session.tree
-    g, pos, options = tree.realize()
+def draw(tree: RedBlackTree, layout: dict):
+    g, pos, options = tree.realize(layout)
     fig = plt.figure(figsize=[figsize]*2)
     plt.axis('off')
     nx.draw_networkx(g, pos, **options)
-    st.pyplot(fig)
+    plt.close(fig)
+    return fig
+
+def show_tree_stats(column, summary: dict):
+    column.subheader('📊Статистика')
+    column.metric('Операций', sum(summary['operations'].values()))
+    column.metric('Сравнений на операцию', f"{summary['comparisons_per_operation']:.1f}")
+    column.metric('Поворотов', summary['rotations'])
+    column.metric('Перекрашиваний', summary['recolorings'])
+    column.metric('Макс. глубина балансировки', summary['max_fixup_depth'])
+    for operation, histogram in summary['histograms_us'].items():
+        column.caption(f'{operation}, мкс')
+        column.bar_chart(histogram)
+
+if session.tree:
+    tree = session.tree
+    shown = list(islice(tree, MAX_SHOWN_VALUES))
+    more = f' ... ещё {len(tree) - len(shown)}' if len(tree) > len(shown) else ''
+    st.subheader(f'👽Вставленные значения: {shown}{more}')
+    try:
+        focus_value = int(focus) if focus else None
+        lo, hi = [int(value) for value in range_field.split()] if range_field else (None, None)
+        view = (tree.version, figsize) if whole_tree else (tree.version, figsize, focus_value, depth, lo, hi)
+        # рисунок перестраивается только при изменении дерева или настроек отображения
+        if session.get('figure_view') != view:
+            with st.spinner('Загрузка...'):
+                layout = tree.layout() if whole_tree else tree.window(focus_value, depth, lo, hi)
+                session.figure = draw(tree, layout)
+                session.figure_view = view
+        if tree.stats is None:
+            st.pyplot(session.figure)
+        else:
+            figure_column, stats_column = st.columns([3, 1])
+            figure_column.pyplot(session.figure)
+            show_tree_stats(stats_column, tree.stats.summary())
+    except ValueError as e:
+        st.error(f'⛔️Неправильный ввод: {e}')
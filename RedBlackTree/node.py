@@ -1,18 +1,18 @@
-from position import Position
 from color import Color
-import math
 
 class Node:
-    def __init__(self, father=None) -> None:
-        self.color = Color.Black
-        self.father: Node | None = father
-        self.left: Node | None = None
-        self._position: Position | None = None
-        self.right: Node | None = None
-        self._value: int | None = None
+    __slots__ = ('value', 'red', 'size', 'father', 'left', 'right')
+
+    def __init__(self, value: int | None = None, father=None, red: bool = False) -> None:
+        self.value = value
+        self.red = red
+        self.size = 1
+        self.father: Node = NIL if father is None else father
+        self.left: Node = NIL
+        self.right: Node = NIL
 
     def __bool__(self) -> bool:
-        return bool(self.value) or self.value == 0
+        return self.value is not None
 
     def __eq__(self, obj) -> bool:
         if isinstance(obj, Node):
@@ -26,8 +26,8 @@ class Node:
             raise ValueError('Object {} not in [Node, int] type'.format(obj))
         return self.value > obj.value if isinstance(obj, Node) else self.value > obj
 
-    def __hash__(self) -> int:
-        return object.__hash__(self)
+    # identity hash without a Python call, nodes are dict keys of the layout
+    __hash__ = object.__hash__
 
     def __lt__(self, obj) -> bool:
         if not isinstance(obj, (Node, int)):
@@ -46,7 +46,7 @@ class Node:
         return str(self.value) if self else 'n'
 
     def child(self, value: int):
-        return self.left if value < self else self.right
+        return self.left if value < self.value else self.right
 
     @property
     def brother(self):
@@ -58,13 +58,21 @@ class Node:
     def children_count(self) -> int:
         return bool(self.right) + bool(self.left)
 
+    @property
+    def color(self) -> Color:
+        return Color.Red if self.red else Color.Black
+
+    @color.setter
+    def color(self, color: Color) -> None:
+        self.red = color is Color.Red
+
     @property
     def grandpa(self):
         return self.father.father if self.father else None
 
     @property
     def is_black(self) -> bool:
-        return self.color == Color.Black
+        return not self.red
 
     @property
     def is_left(self) -> bool:
@@ -72,36 +80,13 @@ class Node:
 
     @property
     def is_red(self) -> bool:
-        return self.color == Color.Red
-
-    @property
-    def position(self) -> Position:
-        if not self.father:
-            return self._position
-        left = (-1)**self.is_left
-        pos = self.father.position.value
-        return pos + Position(left * 2**(pos[1] - 1), -1)
-    
-    def set_position(self, count: int):
-        height = int(2 * math.log2(count + 1))
-        self._position = Position(2**height - 1, height)
+        return self.red
 
     @property
     def uncle(self):
         return self.father.brother if self.father else None
 
-    @property
-    def value(self) -> int:
-        return self._value
-
-    @value.setter
-    def value(self, value: int) -> None:
-        self._value = value if isinstance(value, int) else None
-        if self:
-            self.left = self.left if self.left != None else Node(father=self)
-            self.right = self.right if self.right != None else Node(
-                father=self)
-        else:
-            self.color = Color.Black
-            self.left = None
-            self.right = None
+# shared empty leaf of every tree, always black and never modified
+NIL = Node.__new__(Node)
+NIL.value, NIL.red, NIL.size = None, False, 0
+NIL.father = NIL.left = NIL.right = NIL
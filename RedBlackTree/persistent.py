@@ -0,0 +1,207 @@
+from typing import Iterable
+
+class PersistentNode:
+    """Immutable node, shared between all versions that contain it. Empty leaves are None"""
+    __slots__ = ('value', 'red', 'size', 'left', 'right')
+
+    def __init__(self, red: bool, left, value: int, right) -> None:
+        self.value = value
+        self.red = red
+        self.size = _size(left) + _size(right) + 1
+        self.left: PersistentNode | None = left
+        self.right: PersistentNode | None = right
+
+    def __repr__(self) -> str:
+        return f'<{"Red" if self.red else "Black"}.PersistentNode: {self.value}>'
+
+def _size(node: PersistentNode | None) -> int:
+    return node.size if node else 0
+
+def _is_red(node: PersistentNode | None) -> bool:
+    return node is not None and node.red
+
+def _black(node: PersistentNode) -> PersistentNode:
+    return node if not node.red else PersistentNode(False, node.left, node.value, node.right)
+
+def _balance(left, value, right) -> PersistentNode:
+    """Black node over left and right, rotating away a red child with a red child"""
+    if _is_red(left) and _is_red(right):
+        return PersistentNode(True, _black(left), value, _black(right))
+    if _is_red(left):
+        if _is_red(left.left):
+            return PersistentNode(True, _black(left.left), left.value,
+                                  PersistentNode(False, left.right, value, right))
+        if _is_red(left.right):
+            middle = left.right
+            return PersistentNode(True, PersistentNode(False, left.left, left.value, middle.left),
+                                  middle.value, PersistentNode(False, middle.right, value, right))
+    if _is_red(right):
+        if _is_red(right.right):
+            return PersistentNode(True, PersistentNode(False, left, value, right.left),
+                                  right.value, _black(right.right))
+        if _is_red(right.left):
+            middle = right.left
+            return PersistentNode(True, PersistentNode(False, left, value, middle.left),
+                                  middle.value, PersistentNode(False, middle.right, right.value, right.right))
+    return PersistentNode(False, left, value, right)
+
+def _insert(node: PersistentNode | None, value: int) -> PersistentNode:
+    if node is None:
+        return PersistentNode(True, None, value, None)
+    if value < node.value:
+        left, right = _insert(node.left, value), node.right
+    else:
+        left, right = node.left, _insert(node.right, value)
+    return PersistentNode(True, left, node.value, right) if node.red else _balance(left, node.value, right)
+
+def _redden(node: PersistentNode) -> PersistentNode:
+    if node is None or node.red:
+        raise AssertionError('Black height invariant is broken')
+    return PersistentNode(True, node.left, node.value, node.right)
+
+def _balance_left(left, value, right) -> PersistentNode:
+    """Joins left, whose black height dropped by one, with value and right"""
+    if _is_red(left):
+        return PersistentNode(True, _black(left), value, right)
+    if not _is_red(right):
+        return _balance(left, value, _redden(right))
+    return PersistentNode(True, PersistentNode(False, left, value, right.left.left), right.left.value,
+                          _balance(right.left.right, right.value, _redden(right.right)))
+
+def _balance_right(left, value, right) -> PersistentNode:
+    """Joins left with value and right, whose black height dropped by one"""
+    if _is_red(right):
+        return PersistentNode(True, left, value, _black(right))
+    if not _is_red(left):
+        return _balance(_redden(left), value, right)
+    return PersistentNode(True, _balance(_redden(left.left), left.value, left.right.left),
+                          left.right.value, PersistentNode(False, left.right.right, value, right))
+
+def _append(left, right) -> PersistentNode | None:
+    """Tree of the keys of left and right of equal black height, all of left below right"""
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.red and right.red:
+        middle = _append(left.right, right.left)
+        if _is_red(middle):
+            return PersistentNode(True, PersistentNode(True, left.left, left.value, middle.left), middle.value,
+                                  PersistentNode(True, middle.right, right.value, right.right))
+        return PersistentNode(True, left.left, left.value, PersistentNode(True, middle, right.value, right.right))
+    if not left.red and not right.red:
+        middle = _append(left.right, right.left)
+        if _is_red(middle):
+            return PersistentNode(True, PersistentNode(False, left.left, left.value, middle.left), middle.value,
+                                  PersistentNode(False, middle.right, right.value, right.right))
+        return _balance_left(left.left, left.value, PersistentNode(False, middle, right.value, right.right))
+    if right.red:
+        return PersistentNode(True, _append(left, right.left), right.value, right.right)
+    return PersistentNode(True, left.left, left.value, _append(left.right, right))
+
+def _delete(node: PersistentNode, value: int) -> PersistentNode | None:
+    """Removes value, which must be under node; may return a red root or one black level less"""
+    if value < node.value:
+        if _is_red(node.left):
+            return PersistentNode(True, _delete(node.left, value), node.value, node.right)
+        return _balance_left(_delete(node.left, value), node.value, node.right)
+    if node.value < value:
+        if _is_red(node.right):
+            return PersistentNode(True, node.left, node.value, _delete(node.right, value))
+        return _balance_right(node.left, node.value, _delete(node.right, value))
+    return _append(node.left, node.right)
+
+def _build(values: list[int], start: int, end: int, depth: int, red_depth: int) -> PersistentNode | None:
+    if start >= end:
+        return None
+    middle = (start + end) // 2
+    return PersistentNode(depth == red_depth, _build(values, start, middle, depth + 1, red_depth),
+                          values[middle], _build(values, middle + 1, end, depth + 1, red_depth))
+
+class PersistentRedBlackTree:
+    """Immutable red-black tree: insert and delete return a new version.
+
+    A new version copies only the O(log n) nodes on the search path and
+    shares every other subtree with the version it came from, so keeping
+    old versions costs O(log n) memory per update.
+    """
+    def __init__(self, root: PersistentNode | None = None) -> None:
+        self.root = root
+
+    @classmethod
+    def from_iterable(cls, values: Iterable[int]) -> 'PersistentRedBlackTree':
+        """Balanced tree of distinct values built in O(n) from sorted order"""
+        values = sorted(values)
+        if any(value == next_value for value, next_value in zip(values, values[1:])):
+            raise ValueError('Values must be distinct')
+        depth = len(values).bit_length() - 1
+        red_depth = depth if len(values) + 1 < 2**(depth + 1) else -1
+        return cls(_build(values, 0, len(values), 0, red_depth))
+
+    def __contains__(self, value: int) -> bool:
+        return self.search(value) is not None
+
+    def __iter__(self):
+        stack, node = [], self.root
+        while stack or node is not None:
+            while node is not None:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            yield node.value
+            node = node.right
+
+    def __len__(self) -> int:
+        return _size(self.root)
+
+    def search(self, value: int) -> PersistentNode | None:
+        node = self.root
+        while node is not None and value != node.value:
+            node = node.left if value < node.value else node.right
+        return node
+
+    def insert(self, value: int) -> 'PersistentRedBlackTree':
+        if value in self:
+            raise ValueError(f'Value {value} already exists in the tree')
+        return type(self)(_black(_insert(self.root, value)))
+
+    def delete(self, value: int) -> 'PersistentRedBlackTree':
+        if value not in self:
+            raise ValueError(f'Value {value} not exists in tree')
+        root = _delete(self.root, value)
+        return type(self)(root and _black(root))
+
+class TreeHistory:
+    """Versions of a persistent tree with O(1) undo, redo and checkout"""
+    def __init__(self, tree: PersistentRedBlackTree | None = None) -> None:
+        self.versions: list[PersistentRedBlackTree] = [tree or PersistentRedBlackTree()]
+        self.current = 0
+
+    @property
+    def tree(self) -> PersistentRedBlackTree:
+        return self.versions[self.current]
+
+    def commit(self, tree: PersistentRedBlackTree) -> PersistentRedBlackTree:
+        """Makes tree the newest version, dropping the versions undone before"""
+        del self.versions[self.current + 1:]
+        self.versions.append(tree)
+        self.current += 1
+        return tree
+
+    def insert(self, value: int) -> PersistentRedBlackTree:
+        return self.commit(self.tree.insert(value))
+
+    def delete(self, value: int) -> PersistentRedBlackTree:
+        return self.commit(self.tree.delete(value))
+
+    def checkout(self, version: int) -> PersistentRedBlackTree:
+        if not 0 <= version < len(self.versions):
+            raise IndexError(f'Version {version} out of range for {len(self.versions)} versions')
+        self.current = version
+        return self.tree
+
+    def undo(self) -> PersistentRedBlackTree:
+        return self.checkout(max(self.current - 1, 0))
+
+    def redo(self) -> PersistentRedBlackTree:
+        return self.checkout(min(self.current + 1, len(self.versions) - 1))
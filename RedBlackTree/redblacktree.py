@@ -1,152 +1,863 @@
 import networkx as nx
-from node import Node
-from color import Color
+from typing import Callable, Iterable
+from operator import attrgetter
+import json
+import math
+import struct
+import numpy as np
+from node import Node, NIL
+from stats import TreeStats
+
+# batches of at least size / BULK_RATIO keys are merged by rebuilding the tree
+BULK_RATIO = 2
 
 class RedBlackTree:
+    MAGIC = b'REDBLACK'
+    VERSION = 1
+    ALIGNMENT = 64
+    ARRAYS = ['keys', 'colors', 'shape']
+
     def __init__(self):
-        self.root: Node = Node()
-        self.nodes: dict[int, Node] = {hash(self.root): self.root}
-
-    def __balance(self, node: Node):
-        if node.grandpa and node.father.is_red:
-            if node.uncle.is_red:
-                node.father.color = Color.Black
-                node.uncle.color = Color.Black
-                node.grandpa.color = Color.Red
-                self.__balance(node.grandpa)
-            elif node.father < node.grandpa:
-                self.__LLturn(node)
-            elif node.father > node.grandpa:
-                self.__RRturn(node)
-        self.root.color = Color.Black
-        self.root.set_position(len(self.nodes))
-
-    def __black_list_case(self, node: Node):
-        brother = node.brother
-        if not brother:
-            return
-        if brother.is_black:
-            if brother.left.is_black and brother.right.is_black:
-                brother.color = Color.Red
-                if brother.father.is_red:
-                    brother.father.color = Color.Black
-                else:
-                    self.__black_list_case(node.father)
-            elif brother.is_left:
-                if brother.right.is_red:
-                    self.__RRturn(brother.right.right)
-                brother.left.color = Color.Black
-                self.__LLturn(brother.left)
+        self.root: Node = NIL
+        # last node found, inserted or next to a deletion, a start for nearby keys
+        self.finger: Node = NIL
+        # smallest and largest nodes, appends past either end start there
+        self.__first: Node = NIL
+        self.__last: Node = NIL
+        self.version = 0
+        # (depth, index in level) of every node, kept only once the tree was drawn
+        self.__places: dict[Node, tuple[int, int]] | None = None
+        self.__moved: set[Node] = set()
+        self.__layout: tuple[tuple, dict] | None = None
+        # operation counters, None unless enabled with enable_stats
+        self.stats: TreeStats | None = None
+
+    def __contains__(self, value: int) -> bool:
+        return bool(self.search(value))
+
+    def __iter__(self):
+        return (node.value for node in self.__nodes())
+
+    def __len__(self) -> int:
+        return self.root.size
+
+    def __reversed__(self):
+        stack, node = [], self.root
+        while stack or node is not NIL:
+            while node is not NIL:
+                stack.append(node)
+                node = node.right
+            node = stack.pop()
+            yield node.value
+            node = node.left
+
+    @property
+    def size(self) -> int:
+        return self.root.size
+
+    def enable_stats(self, hook: Callable[[dict], None] | None = None) -> TreeStats:
+        """Starts counting insert, delete and search, hook gets a record of each of them.
+
+        Only this tree is traced, a tree without stats pays one None check
+        per rebalancing loop and rotation.
+        """
+        self.disable_stats()
+        self.stats = TreeStats(hook)
+        self.stats.attach(self)
+        return self.stats
+
+    def disable_stats(self):
+        if self.stats is not None:
+            self.stats.detach(self)
+        self.stats = None
+
+    def __balance(self, node: Node) -> bool:
+        father = node.father
+        depth = recolorings = 0
+        while father.red:
+            depth += 1
+            grandpa = father.father
+            uncle = grandpa.right if father is grandpa.left else grandpa.left
+            if uncle.red:
+                father.red = uncle.red = False
+                grandpa.red = True
+                recolorings += 3
+                node = grandpa
+            elif father is grandpa.left:
+                if node is father.right:
+                    self.__RRturn(father)
+                    node, father = father, node
+                self.__LLturn(grandpa)
+                father.red, grandpa.red = False, True
+                recolorings += 2
             else:
-                if brother.left.is_red:
-                    self.__LLturn(brother.left.left)
-                brother.right.color = Color.Black
-                self.__RRturn(brother.right)
-        else:
-            if brother.is_left:
-                self.__LLturn(brother.left)
+                if node is father.left:
+                    self.__LLturn(father)
+                    node, father = father, node
+                self.__RRturn(grandpa)
+                father.red, grandpa.red = False, True
+                recolorings += 2
+            father = node.father
+        grown = self.root.red
+        self.root.red = False
+        if self.stats is not None:
+            self.stats.fixup(depth, recolorings + grown)
+        return grown
+
+    def __black_list_case(self, node: Node, father: Node):
+        """Restores black height after a black node was removed above node"""
+        depth = recolorings = 0
+        while node is not self.root and not node.red:
+            depth += 1
+            if node is father.left:
+                brother = father.right
+                if brother.red:
+                    brother.red, father.red = False, True
+                    recolorings += 2
+                    self.__RRturn(father)
+                    brother = father.right
+                if not brother.left.red and not brother.right.red:
+                    brother.red = True
+                    recolorings += 1
+                    node, father = father, father.father
+                    continue
+                if not brother.right.red:
+                    brother.left.red, brother.red = False, True
+                    recolorings += 2
+                    self.__LLturn(brother)
+                    brother = father.right
+                brother.red, father.red, brother.right.red = father.red, False, False
+                recolorings += 3
+                self.__RRturn(father)
             else:
-                self.__RRturn(brother.right)
-            self.__black_list_case(node)
+                brother = father.left
+                if brother.red:
+                    brother.red, father.red = False, True
+                    recolorings += 2
+                    self.__LLturn(father)
+                    brother = father.left
+                if not brother.left.red and not brother.right.red:
+                    brother.red = True
+                    recolorings += 1
+                    node, father = father, father.father
+                    continue
+                if not brother.left.red:
+                    brother.right.red, brother.red = False, True
+                    recolorings += 2
+                    self.__RRturn(brother)
+                    brother = father.left
+                brother.red, father.red, brother.left.red = father.red, False, False
+                recolorings += 3
+                self.__LLturn(father)
+            node = self.root
+        if self.stats is not None:
+            self.stats.fixup(depth, recolorings + node.red)
+        node.red = False
 
-    def __LLturn(self, node: Node):
-        if node and node > node.father:
-            self.__RRturn(node.right)
+    def __replace(self, node: Node, other: Node):
+        """Puts other in place of node under node's father"""
         father = node.father
-        grandpa = node.grandpa
-        uncle = node.uncle
-        father_right = father.right
-        father.value, grandpa.value = grandpa.value, father.value
-        grandpa.right = grandpa.left
-        grandpa.left = node
-        father.right = uncle
-        father.left = father_right
-        uncle.father = father
-        node.father = grandpa
+        if father is NIL:
+            self.root = other
+        elif node is father.left:
+            father.left = other
+        else:
+            father.right = other
+        if other is not NIL:
+            other.father = father
+            if self.__places is not None:
+                self.__moved.add(other)
+
+    def __resize(self, node: Node):
+        """Recounts subtree sizes from node up to the root"""
+        while node is not NIL:
+            node.size = node.left.size + node.right.size + 1
+            node = node.father
+
+    def __LLturn(self, node: Node):
+        """Right rotation: the left child takes the place of node"""
+        if self.stats is not None:
+            self.stats.rotations += 1
+        child = node.left
+        node.left = child.right
+        if child.right is not NIL:
+            child.right.father = node
+        self.__replace(node, child)
+        child.right = node
+        node.father = child
+        child.size = node.size
+        node.size = node.left.size + node.right.size + 1
 
     def __RRturn(self, node: Node):
-        if node and node < node.father:
-            self.__LLturn(node.left)
+        """Left rotation: the right child takes the place of node"""
+        if self.stats is not None:
+            self.stats.rotations += 1
+        child = node.right
+        node.right = child.left
+        if child.left is not NIL:
+            child.left.father = node
+        self.__replace(node, child)
+        child.left = node
+        node.father = child
+        child.size = node.size
+        node.size = node.left.size + node.right.size + 1
+
+    def __start(self, value: int, finger: Node | None) -> Node:
+        """Lowest ancestor of finger whose subtree must hold value, the root without finger.
+
+        Climbing stops below the first ancestor on the far side of value, so
+        finding keys d positions away from the finger costs O(log d) on average.
+        Keys beyond the smallest or largest key start at that end in O(1).
+        """
+        if self.__last is not NIL and self.__last.value < value:
+            return self.__last
+        if self.__first is not NIL and value < self.__first.value:
+            return self.__first
+        if not finger or (finger.father is NIL and finger is not self.root):
+            return self.root
+        node = finger
+        if node.value < value:
+            while node.father is not NIL and (node is node.father.right or node.father.value <= value):
+                node = node.father
+        else:
+            while node.father is not NIL and (node is node.father.left or value <= node.father.value):
+                node = node.father
+        return node
+
+    def insert(self, value: int, finger: Node | None = None) -> Node:
+        """Inserts value, searching from finger if given, and returns its node.
+
+        Rotations relink nodes, so the returned node stays valid as a handle
+        and a finger until it is deleted. The finger only shortens the search:
+        subtree sizes are then incremented up to the root, so an insert stays
+        O(log n), though a size update is much cheaper than a key comparison.
+        """
+        node = self.__start(value, finger)
         father = node.father
-        grandpa = node.grandpa
-        uncle = node.uncle
-        father_left = father.left
-        father.value, grandpa.value = grandpa.value, father.value
-        grandpa.left = grandpa.right
-        grandpa.right = node
-        father.left = uncle
-        father.right = father_left
-        uncle.father = father
-        node.father = grandpa
-
-    def insert(self, value: int):
-        node = self.search(value)
-        if node: 
-            raise ValueError(f'Value {value} already exists in the tree')
-        node.value = value
-        node.color = Color.Red
-        self.nodes[hash(node.right)] = node.right
-        self.nodes[hash(node.left)] = node.left
+        while node is not NIL:
+            if value == node.value:
+                raise ValueError(f'Value {value} already exists in the tree')
+            father = node
+            node = node.left if value < node.value else node.right
+        node = Node(value, father, red=True)
+        if father is NIL:
+            self.root = node
+        elif value < father.value:
+            father.left = node
+        else:
+            father.right = node
+        if self.__last is NIL or self.__last.value < value:
+            self.__last = node
+        if self.__first is NIL or value < self.__first.value:
+            self.__first = node
+        while father is not NIL:
+            father.size += 1
+            father = father.father
+        if self.__places is not None:
+            self.__moved.add(node)
         self.__balance(node)
+        self.version += 1
+        self.finger = node
+        return node
 
-    def insert_from(self, values: list[int]):
-        for value in values:
-            self.insert(value)
+    def insert_from(self, values: Iterable[int]):
+        """Inserts all values or none of them, rebuilding the tree for large batches"""
+        values = list(values)
+        if not self.__is_bulk(len(values)):
+            inserted, finger = [], None
+            try:
+                for value in sorted(values):
+                    finger = self.insert(value, finger)
+                    inserted.append(value)
+            except ValueError:
+                self.delete_from(inserted)
+                raise
+            return
+        nodes = sorted([*self.__nodes(), *map(Node, values)], key=attrgetter('value'))
+        keys = [node.value for node in nodes]
+        duplicate = next((key for key, next_key in zip(keys, keys[1:]) if key == next_key), None)
+        if duplicate is not None:
+            raise ValueError(f'Value {duplicate} already exists in the tree')
+        self.__build(nodes)
 
-    def delete(self, obj: int | Node):
-        node = obj if isinstance(obj, Node) else self.search(obj)
-        if not node:
+    def delete(self, obj: int | Node, finger: Node | None = None):
+        """Deletes a value, searched from finger if given, or a node handle.
+
+        Subtree sizes are recounted up to the root, so a delete is O(log n)
+        with or without a finger.
+        """
+        node = obj if isinstance(obj, Node) else self.search(obj, finger)
+        # a handle deleted before keeps its value but is detached from the tree
+        if not node or (node.father is NIL and node is not self.root):
             raise ValueError(f'Value {obj} not exists in tree')
-        elif node.children_count == 0:
-            if node.is_black:
-                self.__black_list_case(node)
-            self.nodes.pop(hash(node.left))
-            self.nodes.pop(hash(node.right))
-            node.value = None
-        elif node.children_count == 1:
-            node_child = node.left or node.right
-            node.value, node_child.value = node_child.value, node.value
-            self.delete(node_child)
-        elif node.children_count == 2:
-            max_right_child = node.left
-            while max_right_child.right:
-                max_right_child = max_right_child.right
-            node.value = max_right_child.value
-            self.delete(max_right_child)
-        self.root.set_position(len(self.nodes))
-
-    def delete_from(self, values: list[int]):
-        for value in values:
-            self.delete(value)
-
-    def search(self, value: int) -> Node:
-        node = self.root
-        while node and node != value:
-            node = node.child(value)
+        if node is self.__last:
+            self.__last = node.left if node.left is not NIL else node.father
+        if node is self.__first:
+            self.__first = node.right if node.right is not NIL else node.father
+        red = node.red
+        if node.left is NIL or node.right is NIL:
+            child = node.right if node.left is NIL else node.left
+            father = node.father
+            self.__replace(node, child)
+        else:
+            max_left_child = node.left
+            while max_left_child.right is not NIL:
+                max_left_child = max_left_child.right
+            red = max_left_child.red
+            child = max_left_child.left
+            if max_left_child.father is node:
+                father = max_left_child
+            else:
+                father = max_left_child.father
+                self.__replace(max_left_child, child)
+                max_left_child.left = node.left
+                node.left.father = max_left_child
+            self.__replace(node, max_left_child)
+            max_left_child.right = node.right
+            node.right.father = max_left_child
+            max_left_child.red = node.red
+        node.father = node.left = node.right = NIL
+        node.size = 1
+        if self.__places is not None:
+            self.__places.pop(node, None)
+        self.__resize(father)
+        if not red:
+            self.__black_list_case(child, father)
+        self.version += 1
+        self.finger = father
+
+    def delete_from(self, values: Iterable[int]):
+        """Deletes all values or none of them, rebuilding the tree for large batches"""
+        values = sorted(values)
+        if not self.__is_bulk(len(values)):
+            deleted = []
+            try:
+                for value in values:
+                    self.delete(value, self.finger)
+                    deleted.append(value)
+            except ValueError:
+                self.insert_from(deleted)
+                raise
+            return
+        nodes, deleted, old = [], [], iter(values)
+        value = next(old, None)
+        for node in self.__nodes():
+            if value is not None and value < node.value:
+                raise ValueError(f'Value {value} not exists in tree')
+            if value == node.value:
+                value = next(old, None)
+                deleted.append(node)
+            else:
+                nodes.append(node)
+        if value is not None:
+            raise ValueError(f'Value {value} not exists in tree')
+        for node in deleted:
+            node.father = node.left = node.right = NIL
+            node.size = 1
+        self.__build(nodes)
+
+    def __is_bulk(self, count: int) -> bool:
+        """Whether rebuilding from a sorted merge beats count single updates"""
+        return count * BULK_RATIO >= self.size
+
+    def __nodes(self):
+        """Nodes in key order"""
+        stack, node = [], self.root
+        while stack or node is not NIL:
+            while node is not NIL:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            yield node
+            node = node.right
+
+    @staticmethod
+    def __black_height(node: Node) -> int:
+        height = 0
+        while node is not NIL:
+            height += not node.red
+            node = node.left
+        return height
+
+    def __concatenate(self, left: Node, left_height: int, node: Node,
+                      right: Node, right_height: int) -> int:
+        """Makes the tree of left, node and right, in key order, self.root and returns its black height.
+
+        node is hung as a red node beside the spine node of the taller tree
+        whose black height equals the shorter one, then rebalanced, which takes
+        O(difference of black heights) steps.
+        """
+        if left.red:
+            left.red, left_height = False, left_height + 1
+        if right.red:
+            right.red, right_height = False, right_height + 1
+        for root in (left, right):
+            if root is not NIL:
+                root.father = NIL
+        height = min(left_height, right_height)
+        taller_left = left_height >= right_height
+        father, child = NIL, left if taller_left else right
+        step = max(left_height, right_height)
+        while child.red or step > height:
+            step -= not child.red
+            father, child = child, child.right if taller_left else child.left
+        node.red, node.father = True, father
+        node.left, node.right = (child, right) if taller_left else (left, child)
+        for subtree in (node.left, node.right):
+            if subtree is not NIL:
+                subtree.father = node
+        if father is NIL:
+            self.root = node
+        else:
+            self.root = left if taller_left else right
+            if taller_left:
+                father.right = node
+            else:
+                father.left = node
+        node.size = node.left.size + node.right.size + 1
+        self.__resize(node.father)
+        return max(left_height, right_height) + self.__balance(node)
+
+    def __reset(self, root: Node):
+        """Takes root as the whole tree, dropping the finger and the layout"""
+        self.root = root
+        self.finger = NIL
+        first = last = root
+        while first.left is not NIL:
+            first = first.left
+        while last.right is not NIL:
+            last = last.right
+        self.__first, self.__last = first, last
+        self.__places = None
+        self.version += 1
+
+    @classmethod
+    def join(cls, left: 'RedBlackTree', pivot: int | Node, right: 'RedBlackTree') -> 'RedBlackTree':
+        """Tree of the keys of left, pivot and right in O(log n), nodes are moved and both trees emptied"""
+        node = pivot if isinstance(pivot, Node) else Node(pivot)
+        if (left and not left.__last.value < node.value) or (right and not node.value < right.__first.value):
+            raise ValueError(f'Keys of left must be below {node.value} and keys of right above it')
+        tree = cls()
+        tree.__concatenate(left.root, cls.__black_height(left.root), node,
+                           right.root, cls.__black_height(right.root))
+        tree.__reset(tree.root)
+        left.__reset(NIL)
+        right.__reset(NIL)
+        return tree
+
+    def split(self, value: int) -> tuple['RedBlackTree', 'RedBlackTree']:
+        """Trees of the keys below value and of the rest in O(log n), this tree is emptied.
+
+        The search path is cut out and its nodes are joined back bottom-up with
+        the subtrees hanging off it. The black heights of the joined trees only
+        grow, so all the joins together cost O(log n).
+        """
+        path, node, height = [], self.root, self.__black_height(self.root)
+        while node is not NIL:
+            height -= not node.red
+            path.append((node, height))
+            node = node.left if value <= node.value else node.right
+        left, right = type(self)(), type(self)()
+        left_root, left_height, right_root, right_height = NIL, 0, NIL, 0
+        for node, height in reversed(path):
+            if value <= node.value:
+                right_height = right.__concatenate(right_root, right_height, node, node.right, height)
+                right_root = right.root
+            else:
+                left_height = left.__concatenate(node.left, height, node, left_root, left_height)
+                left_root = left.root
+        left.__reset(left_root)
+        right.__reset(right_root)
+        self.__reset(NIL)
+        return left, right
+
+    def dump(self, path: str):
+        """Writes the tree as a header followed by its key, color and shape columns.
+
+        The file starts with MAGIC, the format version and the header length as
+        '<II', and the JSON header with the size of the tree and the dtype,
+        shape and offset of every column. Columns start at multiples of
+        ALIGNMENT bytes, offsets count from the first such multiple after the
+        header. keys holds the keys in order, bit i of colors is the color of
+        the i-th key and shape has a left and a right child bit per node in
+        preorder.
+        """
+        keys = np.array(list(self))
+        if keys.dtype.hasobject:
+            raise ValueError('Keys of object dtype can not be dumped')
+        colors, shape, stack = [], [], [self.root] if self else []
+        for node in self.__nodes():
+            colors.append(node.red)
+        while stack:
+            node = stack.pop()
+            shape += [node.left is not NIL, node.right is not NIL]
+            stack += [child for child in (node.right, node.left) if child is not NIL]
+        arrays = [keys, np.packbits(np.array(colors, dtype=bool), bitorder='little'),
+                  np.packbits(np.array(shape, dtype=bool), bitorder='little')]
+        columns, offset = {}, 0
+        for name, array in zip(RedBlackTree.ARRAYS, arrays):
+            columns[name] = dict(dtype=array.dtype.str, shape=array.shape, offset=offset)
+            offset += array.nbytes + -array.nbytes % RedBlackTree.ALIGNMENT
+        header = json.dumps(dict(arrays=columns, size=len(self))).encode()
+        with open(path, 'wb') as file:
+            file.write(RedBlackTree.MAGIC + struct.pack('<II', RedBlackTree.VERSION, len(header)) + header)
+            for array in arrays:
+                file.write(bytes(-file.tell() % RedBlackTree.ALIGNMENT))
+                file.write(array.tobytes())
+
+    @staticmethod
+    def read_header(path: str) -> dict:
+        """Header of a dumped tree with column offsets from the start of the file"""
+        with open(path, 'rb') as file:
+            magic, (version, size) = file.read(8), struct.unpack('<II', file.read(8))
+            if magic != RedBlackTree.MAGIC:
+                raise ValueError(f'{path} is not a dumped tree')
+            elif version != RedBlackTree.VERSION:
+                raise ValueError(f'Tree format version {version} not supported')
+            header = json.loads(file.read(size))
+        start = 16 + size + -(16 + size) % RedBlackTree.ALIGNMENT
+        for column in header['arrays'].values():
+            column['offset'] += start
+        return header
+
+    @staticmethod
+    def read_keys(path: str, mmap: bool = True) -> np.ndarray:
+        """Sorted keys of a dumped tree, with mmap a read-only view of the file"""
+        column = RedBlackTree.read_header(path)['arrays']['keys']
+        if not column['shape'][0]:
+            return np.empty(0, dtype=np.dtype(column['dtype']))
+        read = np.memmap if mmap else np.fromfile
+        kwargs = dict(mode='r', shape=tuple(column['shape'])) if mmap else dict(count=column['shape'][0])
+        return read(path, dtype=np.dtype(column['dtype']), offset=column['offset'], **kwargs)
+
+    @classmethod
+    def load(cls, path: str) -> 'RedBlackTree':
+        """Rebuilds the exact dumped tree in O(n) without inserting"""
+        header = cls.read_header(path)
+        size, columns = header['size'], header['arrays']
+        bits = {}
+        for name in ['colors', 'shape']:
+            column = columns[name]
+            packed = np.fromfile(path, dtype=np.uint8, count=column['shape'][0], offset=column['offset'])
+            count = size * (2 if name == 'shape' else 1)
+            bits[name] = np.unpackbits(packed, count=count, bitorder='little').astype(bool).tolist()
+        nodes = [Node() for _ in range(size)]
+        # preorder: a node is followed by its left subtree, then by its right one
+        shape, waiting, slot = bits['shape'], [], None
+        for number, node in enumerate(nodes):
+            if slot is not None:
+                father, is_left = slot
+                node.father = father
+                if is_left:
+                    father.left = node
+                else:
+                    father.right = node
+            if shape[2 * number + 1]:
+                waiting.append(node)
+            if shape[2 * number]:
+                slot = (node, True)
+            else:
+                slot = (waiting.pop(), False) if waiting else None
+        for node in reversed(nodes):
+            node.size = node.left.size + node.right.size + 1
+        tree = cls()
+        tree.root = nodes[0] if nodes else NIL
+        for node, value, red in zip(tree.__nodes(), cls.read_keys(path, mmap=False).tolist(), bits['colors']):
+            node.value, node.red = value, red
+        tree.__reset(tree.root)
+        return tree
+
+    def validate(self):
+        """Raises AssertionError if the tree breaks a red-black or search tree property"""
+        def black_height(node: Node, low, high) -> int:
+            if node is NIL:
+                return 0
+            if (low is not None and not low < node.value) or (high is not None and not node.value < high):
+                raise AssertionError(f'{node} is out of key order')
+            if node.red and (node.left.red or node.right.red):
+                raise AssertionError(f'{node} is red with a red child')
+            if any(child is not NIL and child.father is not node for child in (node.left, node.right)):
+                raise AssertionError(f'A child of {node} has a wrong father')
+            if node.size != node.left.size + node.right.size + 1:
+                raise AssertionError(f'{node} has a wrong size')
+            left = black_height(node.left, low, node.value)
+            if left != black_height(node.right, node.value, high):
+                raise AssertionError(f'{node} has children of different black heights')
+            return left + (not node.red)
+
+        if self.root.red or self.root.father is not NIL:
+            raise AssertionError('Root is red or has a father')
+        if NIL.red or NIL.size or NIL.value is not None:
+            raise AssertionError('NIL was modified')
+        black_height(self.root, None, None)
+        first = last = self.root
+        while first.left is not NIL:
+            first = first.left
+        while last.right is not NIL:
+            last = last.right
+        if first is not self.__first or last is not self.__last:
+            raise AssertionError('Smallest or largest node is stale')
+
+    def __build(self, nodes: list[Node]):
+        """Perfectly balanced tree over sorted nodes, reusing the node objects.
+
+        Sibling subtrees differ in size by at most one, so every empty leaf lies
+        on the last two levels. Coloring the deepest level red when it is not
+        full keeps the black height equal on all paths.
+        """
+        depth = len(nodes).bit_length() - 1
+        red_depth = depth if len(nodes) + 1 < 2**(depth + 1) else -1
+        self.root = self.__subtree(nodes, 0, len(nodes), 0, red_depth, NIL)
+        self.__first, self.__last = (nodes[0], nodes[-1]) if nodes else (NIL, NIL)
+        self.__places = None
+        self.version += 1
+
+    def __subtree(self, nodes: list[Node], start: int, end: int, depth: int,
+                  red_depth: int, father: Node) -> Node:
+        if start >= end:
+            return NIL
+        middle = (start + end) // 2
+        node = nodes[middle]
+        node.father = father
+        node.red = depth == red_depth
+        node.size = end - start
+        node.left = self.__subtree(nodes, start, middle, depth + 1, red_depth, node)
+        node.right = self.__subtree(nodes, middle + 1, end, depth + 1, red_depth, node)
+        return node
+
+    def search(self, value: int, finger: Node | None = None) -> Node:
+        node = self.__start(value, finger)
+        while node is not NIL and value != node.value:
+            node = node.left if value < node.value else node.right
+        if node is not NIL:
+            self.finger = node
         return node
 
-    def realize(self):
+    def irange(self, lo: int | None = None, hi: int | None = None,
+               inclusive: tuple[bool, bool] = (True, True)):
+        """Keys between lo and hi in order, None bounds are open.
+
+        Only the path to lo and the returned nodes are visited, and the stack
+        never holds more than the tree height.
+        """
+        low, high = inclusive
+        stack, node = [], self.root
+        while True:
+            while node is not NIL:
+                if lo is None or lo < node.value or (low and lo == node.value):
+                    stack.append(node)
+                    node = node.left
+                else:
+                    node = node.right
+            if not stack:
+                return
+            node = stack.pop()
+            if hi is not None and (hi < node.value or (not high and hi == node.value)):
+                return
+            yield node.value
+            node = node.right
+
+    def __rank(self, value: int, inclusive: bool) -> int:
+        count, node = 0, self.root
+        while node is not NIL:
+            if value < node.value or (value == node.value and not inclusive):
+                node = node.left
+            else:
+                count += node.left.size + 1
+                node = node.right
+        return count
+
+    def rank(self, value: int) -> int:
+        """Number of keys less than value"""
+        return self.__rank(value, inclusive=False)
+
+    def select(self, index: int) -> int:
+        """Key with the given index in sorted order"""
+        if not 0 <= index < self.size:
+            raise IndexError(f'Index {index} out of range for {self.size} keys')
+        node = self.root
+        while index != node.left.size:
+            if index < node.left.size:
+                node = node.left
+            else:
+                index -= node.left.size + 1
+                node = node.right
+        return node.value
+
+    def count_range(self, lo: int, hi: int) -> int:
+        """Number of keys in [lo, hi]"""
+        return max(0, self.__rank(hi, inclusive=True) - self.__rank(lo, inclusive=False))
+
+    def floor(self, value: int) -> int | None:
+        """Largest key not greater than value"""
+        result, node = None, self.root
+        while node is not NIL:
+            if value < node.value:
+                node = node.left
+            else:
+                result = node.value
+                node = node.right
+        return result
+
+    def ceil(self, value: int) -> int | None:
+        """Smallest key not less than value"""
+        result, node = None, self.root
+        while node is not NIL:
+            if node.value < value:
+                node = node.right
+            else:
+                result = node.value
+                node = node.left
+        return result
+
+    def __relayout(self) -> dict[Node, tuple[int, int]]:
+        """Updates the places of the subtrees moved since the last layout"""
+        if self.__places is None:
+            self.__places, self.__moved = {}, {self.root}
+        moved = []
+        for node in self.__moved:
+            depth, top = 0, node
+            while top.father is not NIL:
+                depth, top = depth + 1, top.father
+            if node is not NIL and top is self.root:
+                moved.append((depth, node))
+        self.__moved = set()
+        updated = set()
+        for depth, node in sorted(moved, key=lambda item: item[0]):
+            if node in updated:
+                continue
+            father = node.father
+            if father is NIL:
+                stack = [(node, 0, 0)]
+            else:
+                index = self.__places[father][1]
+                stack = [(node, depth, 2 * index + (node is father.right))]
+            while stack:
+                node, depth, index = stack.pop()
+                self.__places[node] = (depth, index)
+                updated.add(node)
+                for child, side in [(node.left, 0), (node.right, 1)]:
+                    if child is not NIL:
+                        stack.append((child, depth + 1, 2 * index + side))
+        return self.__places
+
+    def layout(self, leaves: bool = True) -> dict:
+        """Coordinates, labels, colors and edges as plain arrays, cached until the next change.
+
+        Places (depth, index in level) are kept per node and only the subtrees
+        moved by rotations since the last call are revisited. Empty leaves are
+        drawn as 'n' when leaves is set.
+        """
+        if self.__layout is not None and self.__layout[0] == (self.version, leaves):
+            return self.__layout[1]
+        places = self.__relayout()
+        nodes = list(places)
+        numbers = {node: number for number, node in enumerate(nodes)}
+        depths = [depth for depth, _ in places.values()]
+        indexes = [index for _, index in places.values()]
+        labels = [str(node.value) for node in nodes]
+        colors = ['red' if node.red else 'black' for node in nodes]
+        edges = [(numbers[node.father], number) for number, node in enumerate(nodes)
+                 if node.father is not NIL]
+        if leaves:
+            empty = [(None, 0, 0)] if self.root is NIL else []
+            empty += [(number, places[node][0] + 1, 2 * places[node][1] + side)
+                      for number, node in enumerate(nodes)
+                      for child, side in [(node.left, 0), (node.right, 1)] if child is NIL]
+            for father, depth, index in empty:
+                if father is not None:
+                    edges.append((father, len(labels)))
+                depths.append(depth)
+                indexes.append(index)
+                labels.append('n')
+                colors.append('black')
+        height = int(2 * math.log2(2 * len(self) + 2))
+        layout = self.__arrays(depths, indexes, labels, colors, edges, height)
+        self.__layout = ((self.version, leaves), layout)
+        return layout
+
+    def window(self, focus: int | None = None, depth: int = 4, lo: int | None = None,
+               hi: int | None = None, leaves: bool = True) -> dict:
+        """Layout of the subtree under focus cut to depth levels, in the arrays of layout.
+
+        Subtrees below the last level or with no keys in [lo, hi] are drawn as
+        one gray summary node labelled with their size, so the cost depends on
+        depth and not on the size of the tree.
+        """
+        node = self.root if focus is None else self.search(focus)
+        if focus is not None and not node:
+            raise ValueError(f'Value {focus} not exists in tree')
+        low = high = None
+        child, father = node, node.father
+        while father is not NIL:
+            if low is None and child is father.right:
+                low = father.value
+            if high is None and child is father.left:
+                high = father.value
+            child, father = father, father.father
+        depths, indexes, labels, colors, edges = [], [], [], [], []
+        stack = [(node, None, 0, 0, low, high)]
+        while stack:
+            node, father, level, index, low, high = stack.pop()
+            if node is NIL and not leaves:
+                continue
+            if father is not None:
+                edges.append((father, len(labels)))
+            depths.append(level)
+            indexes.append(index)
+            if node is NIL:
+                labels.append('n')
+                colors.append('black')
+            elif level == depth or (hi is not None and low is not None and low >= hi) \
+                    or (lo is not None and high is not None and high <= lo):
+                labels.append(f'+{node.size}')
+                colors.append('gray')
+            else:
+                labels.append(str(node.value))
+                colors.append('red' if node.red else 'black')
+                number = len(labels) - 1
+                stack.append((node.right, number, level + 1, 2 * index + 1, node.value, high))
+                stack.append((node.left, number, level + 1, 2 * index, low, node.value))
+        return self.__arrays(depths, indexes, labels, colors, edges, depth + 1)
+
+    @staticmethod
+    def __arrays(depths: list[int], indexes: list[int], labels: list[str],
+                 colors: list[str], edges: list[tuple[int, int]], height: int) -> dict:
+        depths, indexes = np.array(depths, dtype=float), np.array(indexes, dtype=float)
+        return {
+            'x': 2**height - 1 + np.exp2(height - depths) * (2 * indexes + 1 - np.exp2(depths)),
+            'y': height - depths,
+            'labels': labels,
+            'colors': colors,
+            'edges': np.array(edges, dtype=np.int64).reshape(-1, 2),
+        }
+
+    def realize(self, layout: dict | None = None):
+        """networkx graph, positions and drawing options of layout, the whole tree by default"""
+        layout = self.layout() if layout is None else layout
         g = nx.DiGraph()
-        g.add_nodes_from(self.nodes.values())
-        g.add_edges_from(self.edges)
+        g.add_nodes_from(range(len(layout['labels'])))
+        g.add_edges_from(layout['edges'].tolist())
         options = {
             "edgecolors": "black",
             "font_color": "white",
             "font_size": 7,
-            "node_color": self.colors,
+            "labels": dict(enumerate(layout['labels'])),
+            "node_color": layout['colors'],
             "node_size": 350,
             "width": 4,
         }
-        return g, self.positions, options
+        return g, dict(enumerate(zip(layout['x'].tolist(), layout['y'].tolist()))), options
 
     @property
     def colors(self) -> list[str]:
-        return [node.color.value for node in self.nodes.values()]
+        return self.layout()['colors']
 
     @property
-    def edges(self) -> list[tuple[Node]]:
-        return [(node, child) for node in self.nodes.values() for child in [node.right, node.left] if node]
+    def edges(self) -> list[tuple[int]]:
+        return [tuple(edge) for edge in self.layout()['edges'].tolist()]
 
     @property
-    def positions(self) -> dict[Node, tuple[int]]:
-        return {node: node.position.value for node in self.nodes.values()}
+    def positions(self) -> dict[int, tuple[float]]:
+        layout = self.layout()
+        return dict(enumerate(zip(layout['x'].tolist(), layout['y'].tolist())))
@@ -0,0 +1,48 @@
+from typing import Iterable
+import threading
+from persistent import PersistentRedBlackTree
+
+class SharedRedBlackTree:
+    """Red-black tree index for many reader threads and one writer at a time.
+
+    Readers take the published persistent version with a plain attribute
+    read, so they never lock and never wait for each other or the writer. A
+    write batch builds the next version by path copying and publishes it with
+    one assignment, readers see either all of a batch or none of it.
+    """
+    def __init__(self, values: Iterable[int] = ()) -> None:
+        self.tree = PersistentRedBlackTree.from_iterable(values)
+        self.__lock = threading.Lock()
+
+    def __contains__(self, value: int) -> bool:
+        return value in self.tree
+
+    def __iter__(self):
+        return iter(self.tree)
+
+    def __len__(self) -> int:
+        return len(self.tree)
+
+    def snapshot(self) -> PersistentRedBlackTree:
+        """Current version, unchanged by later writes"""
+        return self.tree
+
+    def search(self, value: int):
+        return self.tree.search(value)
+
+    def apply(self, inserts: Iterable[int] = (), deletes: Iterable[int] = ()) -> PersistentRedBlackTree:
+        """Deletes then inserts a batch and publishes it at once, or nothing on ValueError"""
+        with self.__lock:
+            tree = self.tree
+            for value in deletes:
+                tree = tree.delete(value)
+            for value in inserts:
+                tree = tree.insert(value)
+            self.tree = tree
+            return tree
+
+    def insert(self, value: int) -> PersistentRedBlackTree:
+        return self.apply(inserts=[value])
+
+    def delete(self, value: int) -> PersistentRedBlackTree:
+        return self.apply(deletes=[value])
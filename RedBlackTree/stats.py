@@ -0,0 +1,119 @@
+from collections import Counter
+from typing import Callable
+import time
+from node import Node
+
+class Counted:
+    """Key wrapper that counts every comparison made with it"""
+    __slots__ = ('value', 'stats')
+
+    def __init__(self, value: int, stats) -> None:
+        self.value = value
+        self.stats = stats
+
+    def __eq__(self, other) -> bool:
+        self.stats.comparisons += 1
+        return self.value == other
+
+    def __lt__(self, other) -> bool:
+        self.stats.comparisons += 1
+        return self.value < other
+
+    def __gt__(self, other) -> bool:
+        self.stats.comparisons += 1
+        return self.value > other
+
+    def __le__(self, other) -> bool:
+        self.stats.comparisons += 1
+        return self.value <= other
+
+    def __ge__(self, other) -> bool:
+        self.stats.comparisons += 1
+        return self.value >= other
+
+    def __hash__(self) -> int:
+        return hash(self.value)
+
+    def __format__(self, spec: str) -> str:
+        return format(self.value, spec)
+
+    def __repr__(self) -> str:
+        return repr(self.value)
+
+class TreeStats:
+    """Operation counters, timing histograms and a tracing hook of one RedBlackTree.
+
+    Attached with RedBlackTree.enable_stats, which shadows insert, delete and
+    search of that tree only, so a tree without stats runs the plain methods.
+    Histograms count operations per power-of-two bucket of microseconds.
+    """
+    OPERATIONS = ['insert', 'delete', 'search']
+
+    def __init__(self, hook: Callable[[dict], None] | None = None) -> None:
+        self.hook = hook
+        self.reset()
+        self.__active = False
+
+    def reset(self):
+        self.operations = Counter()
+        self.comparisons = 0
+        self.rotations = 0
+        self.recolorings = 0
+        self.fixups = 0
+        self.max_fixup_depth = 0
+        self.histograms: dict[str, Counter] = {operation: Counter() for operation in self.OPERATIONS}
+
+    def attach(self, tree):
+        for operation in self.OPERATIONS:
+            method = getattr(type(tree), operation).__get__(tree)
+            setattr(tree, operation, self.__traced(operation, method))
+
+    def detach(self, tree):
+        for operation in self.OPERATIONS:
+            tree.__dict__.pop(operation, None)
+
+    def fixup(self, depth: int, recolorings: int):
+        """Records one rebalancing loop of depth iterations"""
+        self.fixups += depth
+        self.recolorings += recolorings
+        self.max_fixup_depth = max(self.max_fixup_depth, depth)
+
+    def __traced(self, operation: str, method: Callable) -> Callable:
+        def traced(value, *args, **kwargs):
+            if self.__active:
+                return method(value, *args, **kwargs)
+            before = (self.comparisons, self.rotations, self.recolorings, self.fixups)
+            key = value if isinstance(value, Node) else Counted(value, self)
+            self.__active = True
+            start = time.perf_counter_ns()
+            try:
+                result = method(key, *args, **kwargs)
+            finally:
+                elapsed = time.perf_counter_ns() - start
+                self.__active = False
+            if operation == 'insert':
+                result.value = value
+            self.operations[operation] += 1
+            self.histograms[operation][(elapsed // 1000).bit_length()] += 1
+            if self.hook is not None:
+                after = (self.comparisons, self.rotations, self.recolorings, self.fixups)
+                record = dict(zip(['comparisons', 'rotations', 'recolorings', 'fixup_depth'],
+                                  [now - then for now, then in zip(after, before)]))
+                self.hook(dict(record, operation=operation, value=value, seconds=elapsed / 1e9))
+            return result
+        return traced
+
+    def summary(self) -> dict:
+        count = sum(self.operations.values())
+        return {
+            'operations': dict(self.operations),
+            'comparisons': self.comparisons,
+            'comparisons_per_operation': self.comparisons / count if count else 0,
+            'rotations': self.rotations,
+            'recolorings': self.recolorings,
+            'fixup_iterations': self.fixups,
+            'max_fixup_depth': self.max_fixup_depth,
+            'histograms_us': {
+                operation: {f'<{2**bucket}': histogram[bucket] for bucket in sorted(histogram)}
+                for operation, histogram in self.histograms.items() if histogram},
+        }
@@ -0,0 +1,76 @@
+import random
+import pytest
+from node import NIL
+from redblacktree import RedBlackTree
+
+def build(keys: list[int], rng: random.Random, bulk: bool) -> RedBlackTree:
+    """Tree of keys, rebuilt at once or grown by single inserts and reinserts"""
+    tree = RedBlackTree()
+    if bulk:
+        tree.insert_from(keys)
+        return tree
+    for key in rng.sample(keys, len(keys)):
+        tree.insert(key)
+    for key in rng.sample(keys, len(keys) // 5):
+        tree.delete(key)
+        tree.insert(key)
+    return tree
+
+@pytest.mark.parametrize('seed', range(20))
+def test_split_join_keep_invariants(seed):
+    rng = random.Random(seed)
+    for trial in range(50):
+        n = rng.choice([0, 1, 2, 3, 10, 50, 300])
+        keys = sorted(rng.sample(range(10 * n + 5), n))
+        tree = build(keys, rng, bulk=trial % 2 == 0)
+        pivot = rng.randint(-1, 10 * n + 6)
+        left, right = tree.split(pivot)
+        for part in (left, right, tree):
+            part.validate()
+        assert list(left) == [key for key in keys if key < pivot]
+        assert list(right) == [key for key in keys if key >= pivot]
+        assert len(tree) == 0
+        if right:
+            middle = next(iter(right))
+            right.delete(middle)
+            joined = RedBlackTree.join(left, middle, right)
+            joined.validate()
+            assert list(joined) == keys
+            assert len(left) == len(right) == 0
+
+@pytest.mark.parametrize('seed', range(10))
+def test_join_of_uneven_trees(seed):
+    rng = random.Random(seed)
+    small = sorted(rng.sample(range(2000, 2100), rng.randint(0, 50)))
+    large = sorted(rng.sample(range(0, 1000), rng.randint(0, 500)))
+    joined = RedBlackTree.join(build(large, rng, bulk=False), 1500, build(small, rng, bulk=True))
+    joined.validate()
+    assert list(joined) == large + [1500] + small
+
+def test_join_rejects_overlapping_keys():
+    left, right = RedBlackTree(), RedBlackTree()
+    left.insert_from([1, 5])
+    right.insert_from([3])
+    with pytest.raises(ValueError):
+        RedBlackTree.join(left, 4, right)
+
+def preorder(tree: RedBlackTree) -> list[tuple]:
+    """Key, color and children present of every node, which fix the whole tree"""
+    nodes, stack = [], [tree.root] if tree else []
+    while stack:
+        node = stack.pop()
+        nodes.append((node.value, node.red, node.left is not NIL, node.right is not NIL))
+        stack += [child for child in (node.right, node.left) if child is not NIL]
+    return nodes
+
+@pytest.mark.parametrize('n', [0, 1, 2, 7, 64, 65, 1000])
+@pytest.mark.parametrize('bulk', [False, True])
+def test_dump_load_round_trip(tmp_path, n, bulk):
+    rng = random.Random(n)
+    tree = build(sorted(rng.sample(range(-10 * n, 10 * n + 1), n)), rng, bulk)
+    tree.dump(tmp_path / 'tree.rbt')
+    loaded = RedBlackTree.load(tmp_path / 'tree.rbt')
+    loaded.validate()
+    assert preorder(loaded) == preorder(tree)
+    assert len(loaded) == n
+    assert RedBlackTree.read_keys(tmp_path / 'tree.rbt').tolist() == list(tree)
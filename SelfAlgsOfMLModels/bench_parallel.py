@@ -0,0 +1,33 @@
+"""Fit time of CART over the number of worker threads"""
+from argparse import ArgumentParser
+import time
+import numpy as np
+from cart import CART, Tree
+
+def same_tree(first: Tree, second: Tree) -> bool:
+    return all(np.array_equal(getattr(first, name), getattr(second, name), equal_nan=True)
+               for name in ['feature', 'threshold', 'left', 'right', 'value'])
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--features', type=int, default=32)
+    parser.add_argument('--max-depth', type=int, default=10)
+    parser.add_argument('--max-bins', type=int, default=None)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    X = rng.normal(size=(args.rows, args.features))
+    y = X @ rng.normal(size=args.features) + rng.normal(size=args.rows)
+
+    serial = None
+    for n_jobs in args.workers:
+        cart = CART('squared_error', max_depth=args.max_depth,
+                    max_bins=args.max_bins, n_jobs=n_jobs)
+        start = time.perf_counter()
+        cart.fit(X, y)
+        elapsed = time.perf_counter() - start
+        serial = serial or (elapsed, cart.tree)
+        print(f'{n_jobs:>3} workers: {elapsed:8.2f} s, speedup {serial[0] / elapsed:5.2f}, '
+              f'same tree: {same_tree(serial[1], cart.tree)}')
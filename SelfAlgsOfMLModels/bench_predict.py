@@ -0,0 +1,41 @@
+"""Prediction throughput: compiled array tree against the Node pointer walk"""
+from argparse import ArgumentParser
+import time
+import numpy as np
+from cart import CART, Node
+
+def pointer_walk(root: Node, X: np.ndarray) -> list:
+    """Row by row prediction over Node pointers, as CART.predict used to do"""
+    predictions = []
+    for x in X:
+        node = root
+        while node.feature is not None:
+            node = node.left_child if x[node.feature] <= node.threshold else node.right_child
+        predictions.append(node.predicted_value)
+    return predictions
+
+def throughput(predict, X: np.ndarray) -> float:
+    start = time.perf_counter()
+    predict(X)
+    return len(X) / (time.perf_counter() - start)
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--features', type=int, default=20)
+    parser.add_argument('--max-depth', type=int, default=12)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    X = rng.normal(size=(args.rows, args.features))
+    y = X @ rng.normal(size=args.features) + rng.normal(size=args.rows)
+    cart = CART('squared_error', max_depth=args.max_depth, max_bins=256).fit(X, y)
+    assert np.allclose(cart.predict(X[:1000]), pointer_walk(cart.root, X[:1000]))
+
+    print(f'{args.rows} rows, {len(cart.tree.feature)} nodes')
+    for name, predict in [
+        ('pointer walk', lambda X: pointer_walk(cart.root, X)),
+        ('array tree', cart.predict),
+    ]:
+        rate = throughput(predict, X)
+        print(f'{name:>12}: {rate:12,.0f} rows/s {1e6 / rate:8.3f} us/row')
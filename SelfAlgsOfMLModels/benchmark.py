@@ -0,0 +1,152 @@
+"""Headless CART benchmark against sklearn trees over dataset sizes.
+
+Every case runs in a fresh process so its peak RSS is its own. Results are
+written as JSON sorted by case, so files of two commits can be diffed or
+passed to --compare.
+"""
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import time
+import numpy as np
+
+DATASETS = {
+    'synthetic_regression': 'regression',
+    'synthetic_classification': 'classification',
+    'MobileRegr': 'regression',
+    'MobileClassif': 'classification',
+}
+CRITERIA = {
+    'regression': ['squared_error', 'absolute_error'],
+    'classification': ['entropy', 'gini'],
+}
+DATASETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Datasets')
+
+def load_dataset(name: str, rows: int, seed: int = 42):
+    """Features and target of a dataset with the requested number of rows"""
+    rng = np.random.default_rng(seed)
+    if name == 'synthetic_regression':
+        X = rng.normal(size=(rows, 20))
+        y = X @ rng.normal(size=20) + np.sin(3 * X[:, 0]) + rng.normal(size=rows)
+        return X, y
+    elif name == 'synthetic_classification':
+        X = rng.normal(size=(rows, 20))
+        y = np.argmax(X @ rng.normal(size=(20, 4)) + rng.normal(size=(rows, 4)), axis=1)
+        return X, y
+    # bundled CSVs are resampled with replacement up to the requested size
+    import pandas as pd
+    df = pd.read_csv(os.path.join(DATASETS_DIR, f'{name}.csv')).dropna()
+    data = df.to_numpy(dtype=float)[rng.integers(0, len(df), rows)]
+    y = data[:, -1] if DATASETS[name] == 'regression' else data[:, -1].astype(int)
+    return data[:, :-1], y
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if platform.system() == 'Darwin' else peak / 2**10
+
+def run_case(case: dict) -> dict:
+    """Fits and scores one model, executed in its own process"""
+    from sklearn.tree import DecisionTreeClassifier, DecisionTreeRegressor
+    from cart import CART
+
+    X, y = load_dataset(case['dataset'], case['rows'])
+    split = int(0.8 * len(y))
+    x_train, x_test, y_train, y_test = X[:split], X[split:], y[:split], y[split:]
+    result = dict(case, data_rss_mb=peak_rss_mb())
+    if case['model'] == 'cart':
+        model = CART(case['criterion'], max_depth=case['max_depth'], max_bins=case['max_bins'])
+    elif DATASETS[case['dataset']] == 'regression':
+        model = DecisionTreeRegressor(criterion=case['criterion'], max_depth=case['max_depth'])
+    else:
+        model = DecisionTreeClassifier(criterion=case['criterion'], max_depth=case['max_depth'])
+
+    start = time.perf_counter()
+    model.fit(x_train, y_train)
+    result['fit_seconds'] = time.perf_counter() - start
+    start = time.perf_counter()
+    predict = np.asarray(model.predict(x_test))
+    result['predict_rows_per_second'] = len(x_test) / (time.perf_counter() - start)
+    if DATASETS[case['dataset']] == 'regression':
+        result['mse'] = float(np.mean((predict - y_test)**2))
+    else:
+        result['accuracy'] = float(np.mean(predict == y_test))
+    result['peak_rss_mb'] = peak_rss_mb()
+    return result
+
+def cases(args) -> list[dict]:
+    # absolute_error has no histogram mode, its CART cases run exact
+    return [
+        dict(dataset=dataset, rows=rows, model=model, criterion=criterion, max_depth=max_depth,
+             max_bins=args.max_bins if model == 'cart' and criterion != 'absolute_error' else None)
+        for dataset in args.datasets
+        for rows in args.sizes
+        for criterion in CRITERIA[DATASETS[dataset]] if criterion in args.criteria
+        for max_depth in args.depths
+        for model in args.models
+    ]
+
+def case_key(result: dict) -> tuple:
+    return tuple(str(result[key]) for key in
+                 ['dataset', 'rows', 'model', 'criterion', 'max_depth', 'max_bins'])
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return None
+
+def compare(base_path: str, results: list[dict]):
+    """Prints fit time and throughput ratios of matching cases against a base run"""
+    with open(base_path) as file:
+        base = {case_key(result): result for result in json.load(file)['results']}
+    for result in results:
+        before = base.get(case_key(result))
+        if before and 'fit_seconds' in before and 'fit_seconds' in result:
+            print(' '.join(case_key(result)),
+                  f"fit x{result['fit_seconds'] / before['fit_seconds']:.2f}",
+                  f"predict x{result['predict_rows_per_second'] / before['predict_rows_per_second']:.2f}")
+
+def parse_depth(value: str) -> int | None:
+    return None if value == 'None' else int(value)
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--datasets', nargs='+', default=list(DATASETS), choices=DATASETS)
+    parser.add_argument('--sizes', nargs='+', type=int, default=[10**3, 10**4, 10**5, 10**6])
+    parser.add_argument('--criteria', nargs='+', default=[c for v in CRITERIA.values() for c in v])
+    parser.add_argument('--depths', nargs='+', type=parse_depth, default=[4, 8, None])
+    parser.add_argument('--models', nargs='+', default=['cart', 'sklearn'], choices=['cart', 'sklearn'])
+    parser.add_argument('--max-bins', type=int, default=None)
+    parser.add_argument('--absolute-error-rows', type=int, default=2000,
+                        help='absolute_error has no running statistics, larger cases are skipped')
+    parser.add_argument('--output', default='benchmark.json')
+    parser.add_argument('--compare', default=None, help='JSON of an earlier run')
+    args = parser.parse_args()
+
+    results = []
+    context = multiprocessing.get_context('spawn')
+    for case in cases(args):
+        if case['criterion'] == 'absolute_error' and case['rows'] > args.absolute_error_rows:
+            results.append(dict(case, skipped=True))
+            continue
+        with ProcessPoolExecutor(1, mp_context=context) as pool:
+            result = pool.submit(run_case, case).result()
+        results.append(result)
+        print(' '.join(case_key(result)),
+              f"fit {result['fit_seconds']:.3f} s",
+              f"predict {result['predict_rows_per_second']:,.0f} rows/s",
+              f"peak {result['peak_rss_mb']:.0f} MB", flush=True)
+
+    results.sort(key=case_key)
+    meta = dict(commit=git_commit(), python=platform.python_version(),
+                numpy=np.__version__, machine=platform.machine(), cpus=os.cpu_count())
+    with open(args.output, 'w') as file:
+        json.dump(dict(meta=meta, results=results), file, indent=1, sort_keys=True)
+    if args.compare:
+        compare(args.compare, results)
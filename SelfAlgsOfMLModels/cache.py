@@ -0,0 +1,125 @@
+"""Datasets and fitted models of the Streamlit app, shared by all reruns and sessions"""
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Hashable
+import hashlib
+import io
+import pickle
+import sys
+import threading
+import numpy as np
+import pandas as pd
+from cart import Node, Tree
+
+# memory of one Node object with its attribute dict
+NODE_BYTES = sys.getsizeof(Node()) + sys.getsizeof(Node().__dict__)
+
+def content_hash(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+class Dataset:
+    """Parsed CSV kept as one typed NumPy array per column"""
+    def __init__(self, columns: dict[str, np.ndarray]) -> None:
+        self.columns = columns
+        self.__splits: dict[tuple, tuple[np.ndarray, np.ndarray]] = {}
+
+    @classmethod
+    def read_csv(cls, data: bytes) -> 'Dataset':
+        frame = pd.read_csv(io.BytesIO(data))
+        return cls({str(name): frame[name].to_numpy() for name in frame.columns})
+
+    @property
+    def names(self) -> list[str]:
+        return list(self.columns)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(column.nbytes for column in self.columns.values())
+
+    def features(self, target: str) -> np.ndarray:
+        """All columns but target as one matrix of their common dtype"""
+        return np.column_stack([column for name, column in self.columns.items() if name != target])
+
+    def split(self, test_size: float = 0.2, random_state: int = 42) -> tuple[np.ndarray, np.ndarray]:
+        """Train and test row indices, computed once per arguments"""
+        key = (test_size, random_state)
+        if key not in self.__splits:
+            from sklearn.model_selection import train_test_split
+            rows = np.arange(len(next(iter(self.columns.values()), [])))
+            self.__splits[key] = tuple(train_test_split(rows, test_size=test_size,
+                                                        random_state=random_state))
+        return self.__splits[key]
+
+def model_nbytes(model) -> int:
+    """Approximate memory of a fitted model"""
+    if hasattr(model, 'trees'):
+        return sum(map(model_nbytes, model.trees))
+    if isinstance(getattr(model, 'tree', None), Tree):
+        nodes = len(model.tree.feature) if getattr(model, 'root', None) is not None else 0
+        return sum(getattr(model.tree, name).nbytes for name in Tree.ARRAYS) + nodes * NODE_BYTES
+    return len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL))
+
+class LRUCache:
+    """Thread-safe cache that drops least recently used values past max_bytes.
+
+    A value larger than max_bytes on its own is returned but not kept.
+    """
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.__entries: OrderedDict[Hashable, tuple[object, int]] = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.__entries
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    def get(self, key: Hashable, default=None):
+        with self.__lock:
+            if key not in self.__entries:
+                return default
+            self.__entries.move_to_end(key)
+            return self.__entries[key][0]
+
+    def put(self, key: Hashable, value, nbytes: int):
+        with self.__lock:
+            if key in self.__entries:
+                self.nbytes -= self.__entries.pop(key)[1]
+            if nbytes > self.max_bytes:
+                return
+            self.__entries[key] = (value, nbytes)
+            self.nbytes += nbytes
+            while self.nbytes > self.max_bytes:
+                self.nbytes -= self.__entries.popitem(last=False)[1][1]
+
+class FitCache(LRUCache):
+    """LRU cache of fitted models that fits missing ones in a background thread"""
+    def __init__(self, max_bytes: int, workers: int = 1) -> None:
+        super().__init__(max_bytes)
+        self.__pending: dict[Hashable, Future] = {}
+        self.__lock = threading.Lock()
+        self.__pool = ThreadPoolExecutor(workers, thread_name_prefix='fit')
+
+    def submit(self, key: Hashable, fit: Callable[[], tuple[object, int]]) -> Future:
+        """Runs fit, which returns a value and its size, unless key is cached or pending"""
+        with self.__lock:
+            if key in self.__pending:
+                return self.__pending[key]
+            future = Future()
+            if key in self:
+                future.set_result(self.get(key))
+                return future
+            future = self.__pool.submit(self.__fit, key, fit)
+            self.__pending[key] = future
+            return future
+
+    def __fit(self, key: Hashable, fit: Callable[[], tuple[object, int]]):
+        try:
+            value, nbytes = fit()
+            self.put(key, value, nbytes)
+            return value
+        finally:
+            with self.__lock:
+                self.__pending.pop(key, None)
@@ -1,4 +1,12 @@
-from typing import Literal, Callable
+from typing import Literal, Callable, Iterable
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import partial
+import heapq
+import itertools
+import json
+import os
+import struct
 import numpy as np
 from collections import Counter
 
@@ -16,21 +24,219 @@ class Node:
         self.left_child = left_child
         self.right_child = right_child
 
-def mean_squared_error(column: np.ndarray):
-    return np.mean((column - np.mean(column))**2 )
+class Tree:
+    """Tree compiled into parallel arrays, leaves have feature -1"""
+    def __init__(self,
+        feature: np.ndarray,
+        threshold: np.ndarray,
+        left: np.ndarray,
+        right: np.ndarray,
+        value: np.ndarray
+    ):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+
+    @classmethod
+    def from_root(cls, root: Node):
+        nodes, stack = [], [root]
+        while stack: # preorder, node ids are positions in nodes
+            node = stack.pop()
+            nodes.append(node)
+            if node.feature is not None:
+                stack.extend([node.right_child, node.left_child])
+        ids = {id(node): i for i, node in enumerate(nodes)}
+        leaves = [i for i, node in enumerate(nodes) if node.feature is None]
+        leaf_values = np.array([nodes[i].predicted_value for i in leaves])
+        value = np.zeros(len(nodes), dtype=leaf_values.dtype)
+        value[leaves] = leaf_values
+        split = lambda get, default: [
+            default if node.feature is None else get(node) for node in nodes]
+        return cls(
+            feature=np.array(split(lambda node: node.feature, -1), dtype=np.intp),
+            threshold=np.array(split(lambda node: node.threshold, np.nan), dtype=float),
+            left=np.array(split(lambda node: ids[id(node.left_child)], -1), dtype=np.intp),
+            right=np.array(split(lambda node: ids[id(node.right_child)], -1), dtype=np.intp),
+            value=value)
+
+    @property
+    def depth(self) -> int:
+        depth, level = 0, np.array([0])
+        while not null(level := level[self.feature[level] >= 0]):
+            level = np.concatenate([self.left[level], self.right[level]])
+            depth += 1
+        return depth
+
+    def apply(self, X: np.ndarray, batch_size: int = 4096) -> np.ndarray:
+        """Leaf id of every row, all rows of a batch descend one level per step"""
+        is_leaf = self.feature < 0
+        ids = np.arange(len(is_leaf))
+        # leaves loop back to themselves, so rows that reached one stay there
+        feature = np.where(is_leaf, 0, self.feature)
+        threshold = np.where(is_leaf, 0, self.threshold)
+        left = np.where(is_leaf, ids, self.left)
+        right = np.where(is_leaf, ids, self.right)
+        depth = self.depth
+        leaves = np.empty(len(X), dtype=np.intp)
+        for start in range(0, len(X), batch_size):
+            batch = X[start:start + batch_size]
+            flat, offsets = batch.ravel(), np.arange(len(batch)) * batch.shape[1]
+            node = np.zeros(len(batch), dtype=np.intp)
+            for _ in range(depth):
+                node = np.where(flat[offsets + feature[node]] <= threshold[node],
+                                left[node], right[node])
+            leaves[start:start + batch_size] = node
+        return leaves
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return self.value[self.apply(X)]
+
+    ARRAYS = ['feature', 'threshold', 'left', 'right', 'value']
+    MAGIC = b'CARTTREE'
+    VERSION = 1
+    ALIGNMENT = 64
 
-def mean_absolute_error(column: np.ndarray):
-    return np.sum(np.absolute(column - np.mean(column))) / column.shape[0]
+    def save(self, path: str, metadata: dict | None = None):
+        """Writes a versioned header and the node arrays as aligned columns.
 
-def entropy(column: np.ndarray):
-    probabilities = np.array(list(Counter(column).values())) / len(column)
+        Layout: magic, uint32 version, uint32 header size, JSON header with the
+        dtype, shape and offset of every array, then the raw arrays.
+        """
+        arrays = [np.ascontiguousarray(getattr(self, name)) for name in Tree.ARRAYS]
+        if any(array.dtype.hasobject for array in arrays):
+            raise ValueError('Tree values of object dtype can not be saved')
+        align = lambda size: -(-size // Tree.ALIGNMENT) * Tree.ALIGNMENT
+        # offsets depend on the header size, which depends on the offsets digits
+        offset, header = 0, b''
+        while offset < align(16 + len(header)):
+            offset = align(16 + len(header) + 64)
+            columns, position = {}, offset
+            for name, array in zip(Tree.ARRAYS, arrays):
+                columns[name] = dict(dtype=array.dtype.str, shape=array.shape, offset=position)
+                position = align(position + array.nbytes)
+            header = json.dumps(dict(arrays=columns, metadata=metadata or {})).encode()
+        with open(path, 'wb') as file:
+            file.write(Tree.MAGIC + struct.pack('<II', Tree.VERSION, len(header)) + header)
+            for name, array in zip(Tree.ARRAYS, arrays):
+                file.seek(columns[name]['offset'])
+                file.write(array.tobytes())
+
+    @staticmethod
+    def read_header(path: str) -> dict:
+        with open(path, 'rb') as file:
+            magic, (version, size) = file.read(8), struct.unpack('<II', file.read(8))
+            if magic != Tree.MAGIC:
+                raise ValueError(f'{path} is not a saved tree')
+            elif version != Tree.VERSION:
+                raise ValueError(f'Tree format version {version} not supported')
+            return json.loads(file.read(size))
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True):
+        """Reads a saved tree, with mmap the arrays are read-only views of the file"""
+        columns = cls.read_header(path)['arrays']
+        arrays = {}
+        for name in cls.ARRAYS:
+            column = columns[name]
+            shape = tuple(column['shape'])
+            if 0 in shape:
+                array = np.empty(shape, dtype=column['dtype'])
+            else:
+                array = np.memmap(path, dtype=column['dtype'], mode='r',
+                                  offset=column['offset'], shape=shape)
+            arrays[name] = array if mmap else np.array(array)
+        return cls(**arrays)
+
+def mean_squared_error(column: np.ndarray, sample_weight: np.ndarray | None = None):
+    mean = np.average(column, weights=sample_weight)
+    return np.average((column - mean)**2, weights=sample_weight)
+
+def mean_absolute_error(column: np.ndarray, sample_weight: np.ndarray | None = None):
+    mean = np.average(column, weights=sample_weight)
+    return np.average(np.absolute(column - mean), weights=sample_weight)
+
+def class_weights(column: np.ndarray, sample_weight: np.ndarray | None = None):
+    """Total weight of every class present in the column"""
+    codes = np.unique(column, return_inverse=True)[1]
+    return np.bincount(codes, weights=sample_weight)
+
+def entropy(column: np.ndarray, sample_weight: np.ndarray | None = None):
+    probabilities = class_weights(column, sample_weight)
+    probabilities = probabilities[probabilities > 0] / probabilities.sum()
     return -np.sum(probabilities * np.log2(probabilities))
 
-def gini(column: np.ndarray):
-    column = np.sort(column)
-    n = column.shape[0]
-    index = np.arange(1, n + 1)
-    return ((np.sum((2 * index - n  - 1) * column)) / (n * np.sum(column)))
+def gini(column: np.ndarray, sample_weight: np.ndarray | None = None):
+    """Gini impurity of the class distribution"""
+    probabilities = class_weights(column, sample_weight)
+    probabilities = probabilities / probabilities.sum()
+    return 1 - np.sum(probabilities**2)
+
+# Split costs score a whole batch of candidate children at once: each row holds the
+# summed statistics of one child, the result is the criterion times the child weight
+
+def squared_error_cost(stats: np.ndarray):
+    """Sum of squared errors from rows of (weight, sum, sum of squares)"""
+    count, total, squares = stats.T
+    return squares - total**2 / count
+
+def entropy_cost(counts: np.ndarray):
+    """Entropy times weight from rows of class weights"""
+    n = counts.sum(axis=1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return -np.nansum(counts * np.log2(counts / n), axis=1)
+
+def gini_cost(counts: np.ndarray):
+    """Gini impurity times weight from rows of class weights"""
+    n = counts.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return n - np.sum(counts**2, axis=1) / n
+
+def mean_leaf(y: np.ndarray, sample_weight: np.ndarray | None = None) -> Node:
+    return Node(np.average(y, weights=sample_weight))
+
+def most_common_leaf(y: np.ndarray, sample_weight: np.ndarray | None = None) -> Node:
+    if sample_weight is None:
+        return Node(Counter(y).most_common(1)[0][0])
+    classes, codes = np.unique(y, return_inverse=True)
+    return Node(classes[np.argmax(np.bincount(codes, weights=sample_weight))])
+
+class QuantileSketch:
+    """Mergeable weighted summary of a column stream, keeps at most capacity points"""
+    def __init__(self, capacity: int = 4096):
+        self.capacity = capacity
+        self.values = np.empty(0)
+        self.weights = np.empty(0)
+
+    def update(self, column: np.ndarray, weights: np.ndarray | None = None):
+        values, inverse = np.unique(np.concatenate([self.values, column]), return_inverse=True)
+        weights = np.ones(len(column)) if weights is None else weights
+        self.values = values
+        self.weights = np.bincount(inverse, np.concatenate([self.weights, weights]))
+        if len(self.values) > self.capacity:
+            self.__compress()
+        return self
+
+    def __compress(self):
+        """Merges neighbours into capacity groups of equal weight, a group keeps its maximum"""
+        before = np.cumsum(self.weights) - self.weights
+        group = np.minimum(before * self.capacity // self.weights.sum(), self.capacity - 1)
+        starts = np.flatnonzero(np.diff(group, prepend=-1))
+        self.weights = np.add.reduceat(self.weights, starts)
+        self.values = self.values[np.r_[starts[1:] - 1, len(group) - 1]]
+
+    def edges(self, max_bins: int) -> np.ndarray:
+        """Bin edges as CART quantizes a column, exact while few values are seen"""
+        values = self.values
+        if len(values) > max_bins:
+            cumulative = np.cumsum(self.weights)
+            ranks = np.linspace(0, 1, max_bins + 1)[1:] * cumulative[-1]
+            values = np.unique(values[np.searchsorted(cumulative, ranks).clip(max=len(values) - 1)])
+        return values[:-1]
+
+# splits that gain less than rounding errors are not worth a node
+EPSILON = np.finfo(float).eps
 
 def null(x) -> bool:
     return x.shape[0] == 0 if type(x) is np.ndarray else not bool(x)
@@ -43,6 +249,11 @@ class CART:
         'entropy': entropy,
         'gini': gini,
     }
+    SPLIT_COSTS = {
+        'squared_error': squared_error_cost,
+        'entropy': entropy_cost,
+        'gini': gini_cost,
+    }
 
     @staticmethod
     def __initialization(func):
@@ -52,9 +263,21 @@ class CART:
             if self.criterion not in CART.CRITERIONS:
                 raise ValueError(f'Criterion {self.criterion} not exists')
             elif self.criterion in ['squared_error', 'absolute_error']:
-                self.list = lambda Y: Node(np.mean(Y))
+                self.list = mean_leaf
             else: # classification
-                self.list = lambda Y: Node(Counter(Y).most_common(1)[0][0])
+                self.list = most_common_leaf
+            self.split_cost = CART.SPLIT_COSTS.get(self.criterion)
+            if self.max_bins is not None:
+                if self.split_cost is None:
+                    raise ValueError(f'Criterion {self.criterion} not supports max_bins')
+                elif not 2 <= self.max_bins <= 2**16:
+                    raise ValueError(f'max_bins {self.max_bins} not in [2, 65536]')
+            if isinstance(self.max_features, str) and self.max_features not in ['sqrt', 'log2']:
+                raise ValueError(f'max_features {self.max_features} not in [sqrt, log2]')
+            if self.max_leaf_nodes is not None and self.max_leaf_nodes < 2:
+                raise ValueError(f'max_leaf_nodes {self.max_leaf_nodes} must be at least 2')
+            if self.min_impurity_decrease < 0:
+                raise ValueError(f'min_impurity_decrease {self.min_impurity_decrease} is negative')
             self.criterion = CART.CRITERIONS[self.criterion]
         return init_wrapper
 
@@ -63,56 +286,500 @@ class CART:
         self,
         criterion: Literal['squared_error', 'absolute_error', 'entropy', 'gini'],
         max_depth: int | None = None,
-        min_samples_split: int = 2
+        min_samples_split: int = 2,
+        max_bins: int | None = None,
+        n_jobs: int | None = None,
+        parallel_depth: int = 3,
+        max_features: int | float | Literal['sqrt', 'log2'] | None = None,
+        random_state: int | None = None,
+        max_leaf_nodes: int | None = None,
+        min_impurity_decrease: float = 0.0
     ) -> None:
         self.max_depth = max_depth
         self.criterion = criterion
         self.min_samples_split = min_samples_split
-        self.list: Callable[[np.ndarray], float | int] | None = None
+        self.max_bins = max_bins
+        self.n_jobs = n_jobs
+        self.parallel_depth = parallel_depth
+        self.max_features = max_features
+        self.random_state = random_state
+        self.max_leaf_nodes = max_leaf_nodes
+        self.min_impurity_decrease = min_impurity_decrease
+        self.bin_edges: list[np.ndarray] | None = None
+        self.list: Callable[..., Node] | None = None
+        self.split_cost: Callable[..., np.ndarray] | None = None
 
-    def __split_dataset(
-        self, X: np.ndarray, y: np.ndarray, feature: int, threshold: float
+    @staticmethod
+    def __partition(
+        X: np.ndarray, samples: np.ndarray, start: int, end: int, feature: int, threshold
+    ) -> int:
+        """Reorders samples[start:end] so left rows come first, returns the border"""
+        block = samples[start:end]
+        is_left = X[block, feature] <= threshold
+        samples[start:end] = np.concatenate([block[is_left], block[~is_left]])
+        return start + np.count_nonzero(is_left)
+
+    def __statistics(
+        self, y: np.ndarray, weight: np.ndarray | None = None,
+        center: float | None = None, classes: np.ndarray | None = None
     ):
-        left_indexes = np.where(X[:, feature] <= threshold)[0]
-        right_indexes = np.where(X[:, feature] > threshold)[0]
-        return X[left_indexes], y[left_indexes], X[right_indexes], y[right_indexes]
+        """Per-sample weighted sufficient statistics of y for split_cost"""
+        weight = np.ones(len(y)) if weight is None else weight
+        if self.split_cost is None:
+            return None
+        elif self.split_cost is squared_error_cost:
+            centered = y - (np.average(y, weights=weight) if center is None else center)
+            return np.column_stack([weight, weight * centered, weight * centered**2])
+        if classes is None:
+            classes, codes = np.unique(y, return_inverse=True)
+        else:
+            codes = np.searchsorted(classes, y)
+        counts = np.zeros((len(y), len(classes)))
+        counts[np.arange(len(y)), codes] = weight
+        return counts
 
-    def __find_best_split(self, X: np.ndarray, y: np.ndarray):
-        best_feature, best_threshold, best_criterion_score = None, None, np.inf
+    def __quantize(self, X: np.ndarray):
+        """Bin codes of X, bin b of a feature holds values in (edges[b - 1], edges[b]]"""
+        self.bin_edges = []
         for feature in range(X.shape[1]):
-            thresholds = np.unique(X[:, feature])
-            for threshold in thresholds:
-                _, y_left, _, y_right = self.__split_dataset(X, y, feature, threshold)
-                if not (null(y_left) or null(y_right)):
-                    criterion_score = (len(y_left) * self.criterion(y_left) +
-                        len(y_right) * self.criterion(y_right)) / len(y)
-                    if criterion_score < best_criterion_score:
-                        best_feature, best_threshold, best_criterion_score = (
-                            feature, threshold, criterion_score)
-        return best_feature, best_threshold
-
-    def __build_tree(self, X: np.ndarray, y: np.ndarray, depth: int = 0):
-        if depth == self.max_depth or len(X) <= self.min_samples_split:
-            return self.list(y)
-        feature, threshold = self.__find_best_split(X, y)
-        if not threshold:
-            return self.list(y)
-        x_left, y_left, x_right, y_right = self.__split_dataset(X, y, feature, threshold)
-        left_child = self.__build_tree(x_left, y_left, depth + 1)
-        right_child = self.__build_tree(x_right, y_right, depth + 1)
+            values = np.unique(X[:, feature])
+            if len(values) > self.max_bins:
+                quantiles = np.linspace(0, 1, self.max_bins + 1)[1:]
+                values = np.unique(np.quantile(X[:, feature], quantiles, method='inverted_cdf'))
+            self.bin_edges.append(values[:-1])
+        return self.__bin_codes(X)
+
+    def __bin_codes(self, X: np.ndarray):
+        n_bins = max(len(edges) for edges in self.bin_edges) + 1
+        codes = np.empty(X.shape, dtype=np.uint8 if n_bins <= 2**8 else np.uint16)
+        for feature, edges in enumerate(self.bin_edges):
+            codes[:, feature] = np.searchsorted(edges, X[:, feature])
+        return codes
+
+    def __histogram(self, codes: np.ndarray, stats: np.ndarray, block: np.ndarray):
+        """Per-bin sample counts and summed statistics of every feature"""
+        n_bins = max(len(edges) for edges in self.bin_edges) + 1
+        counts = np.empty((codes.shape[1], n_bins))
+        sums = np.empty((codes.shape[1], n_bins, stats.shape[1]))
+        block_stats = stats[block]
+        for feature in range(codes.shape[1]):
+            column = codes[block, feature]
+            counts[feature] = np.bincount(column, minlength=n_bins)
+            for j in range(stats.shape[1]):
+                sums[feature, :, j] = np.bincount(
+                    column, weights=block_stats[:, j], minlength=n_bins)
+        return counts, sums
+
+    def __best_split_point(self, cumulative: np.ndarray, split_points: np.ndarray, n: int):
+        """Position in split_points with the lowest criterion and the criterion"""
+        left = cumulative[split_points]
+        scores = (self.split_cost(left) + self.split_cost(cumulative[-1] - left)) / n
+        scores = np.nan_to_num(scores, nan=np.inf)
+        best = np.argmin(scores)
+        return best, scores[best]
+
+    def __split_scores(
+        self, target: np.ndarray, weight: np.ndarray | None, split_points: np.ndarray
+    ):
+        """Criterion of every split given by the last left index of a sorted target"""
+        weight = np.ones(len(target)) if weight is None else weight
+        cumulative = np.cumsum(weight)
+        return np.nan_to_num(np.array([
+            (cumulative[i] * self.criterion(target[:i + 1], weight[:i + 1]) +
+             (cumulative[-1] - cumulative[i]) *
+             self.criterion(target[i + 1:], weight[i + 1:])) / cumulative[-1]
+            for i in split_points]), nan=np.inf)
+
+    def __feature_split(
+        self, X: np.ndarray, y: np.ndarray, weight: np.ndarray | None, stats: np.ndarray,
+        block: np.ndarray, feature: int
+    ):
+        """Lowest criterion over thresholds of one feature and its threshold"""
+        column = X[block, feature]
+        order = np.argsort(column, kind='stable')
+        column, rows = column[order], block[order]
+        split_points = np.flatnonzero(column[:-1] != column[1:])
+        if null(split_points):
+            return np.inf, None
+        if stats is None: # absolute_error has no running statistics
+            scores = self.__split_scores(
+                y[rows], None if weight is None else weight[rows], split_points)
+            best = np.argmin(scores)
+            score = scores[best]
+        else:
+            best, score = self.__best_split_point(
+                np.cumsum(stats[rows], axis=0), split_points, len(block))
+        return score, column[split_points[best]]
+
+    def __bin_split(self, histogram, feature: int):
+        """Lowest criterion over bins of one feature and its bin"""
+        counts, sums = histogram[0][feature], histogram[1][feature]
+        n = counts.sum()
+        split_points = np.flatnonzero((counts > 0) & (np.cumsum(counts) < n))
+        if null(split_points):
+            return np.inf, None
+        best, score = self.__best_split_point(np.cumsum(sums, axis=0), split_points, n)
+        return score, split_points[best]
+
+    @staticmethod
+    def __best_feature(features: np.ndarray, splits):
+        best_feature, best_split, best_criterion_score = None, None, np.inf
+        for feature, (score, split) in zip(features.tolist(), splits):
+            if score < best_criterion_score:
+                best_feature, best_split, best_criterion_score = feature, split, score
+        return best_feature, best_split, best_criterion_score
+
+    def __find_best_split(
+        self, X: np.ndarray, y: np.ndarray, weight: np.ndarray | None, stats: np.ndarray,
+        block: np.ndarray, features: np.ndarray, pool: ThreadPoolExecutor | None = None
+    ):
+        evaluate = partial(self.__feature_split, X, y, weight, stats, block)
+        return self.__best_feature(features, (pool.map if pool else map)(evaluate, features))
+
+    def __find_best_bin(
+        self, histogram, features: np.ndarray, pool: ThreadPoolExecutor | None = None
+    ):
+        evaluate = partial(self.__bin_split, histogram)
+        return self.__best_feature(features, (pool.map if pool else map)(evaluate, features))
+
+    def __features(self, n_features: int, seed: np.random.SeedSequence | None):
+        """Features examined at a node, a sorted random subset if max_features is set"""
+        if seed is None:
+            return np.arange(n_features)
+        elif self.max_features == 'sqrt':
+            size = int(np.sqrt(n_features))
+        elif self.max_features == 'log2':
+            size = int(np.log2(n_features))
+        elif isinstance(self.max_features, float):
+            size = int(self.max_features * n_features)
+        else:
+            size = self.max_features
+        size = min(max(size, 1), n_features)
+        return np.sort(np.random.default_rng(seed).choice(n_features, size, replace=False))
+
+    def __leaf(self, y: np.ndarray, weight: np.ndarray | None, block: np.ndarray) -> Node:
+        return self.list(y[block], None if weight is None else weight[block])
+
+    def __node_cost(
+        self, y: np.ndarray, weight: np.ndarray | None, stats: np.ndarray,
+        block: np.ndarray, histogram=None
+    ) -> tuple[float, float]:
+        """Criterion times weight of a node and the divisor of its split scores"""
+        if histogram is not None:
+            counts, sums = histogram
+            return self.split_cost(sums[0].sum(axis=0)[None])[0], counts[0].sum()
+        elif stats is None:
+            block_weight = None if weight is None else weight[block]
+            node_weight = len(block) if weight is None else block_weight.sum()
+            return self.criterion(y[block], block_weight) * node_weight, node_weight
+        return self.split_cost(stats[block].sum(axis=0)[None])[0], len(block)
+
+    def __split(
+        self, X: np.ndarray, y: np.ndarray, weight: np.ndarray | None, stats: np.ndarray,
+        samples: np.ndarray, start: int, end: int, depth: int, histogram=None,
+        pool: ThreadPoolExecutor | None = None, seed: np.random.SeedSequence | None = None
+    ):
+        """Impurity decrease, feature, split and histogram of the best split of samples[start:end].
+
+        The decrease is weighted by the node's share of the total sample weight. Feature
+        is None if the node stays a leaf: at max_depth, with too few or identical
+        targets, or when no split decreases impurity by min_impurity_decrease.
+        """
+        block = samples[start:end]
+        if (depth == self.max_depth or end - start <= self.min_samples_split
+                or np.all(y[block] == y[block[0]])):
+            return 0.0, None, None, histogram
+        features = self.__features(X.shape[1], seed)
+        if self.max_bins is None:
+            feature, split, score = self.__find_best_split(
+                X, y, weight, stats, block, features, pool)
+            cost, scale = self.__node_cost(y, weight, stats, block)
+        else:
+            histogram = histogram or self.__histogram(X, stats, block)
+            feature, split, score = self.__find_best_bin(histogram, features, pool)
+            cost, scale = self.__node_cost(y, weight, stats, block, histogram)
+        decrease = (cost - score * scale) / self.__total_weight
+        if feature is None or decrease + EPSILON < self.min_impurity_decrease:
+            return decrease, None, None, histogram
+        return decrease, feature, split, histogram
+
+    def __threshold(self, feature: int, split):
+        return split if self.max_bins is None else self.bin_edges[feature][split]
+
+    def __child_histograms(
+        self, X: np.ndarray, stats: np.ndarray, samples: np.ndarray,
+        start: int, middle: int, end: int, histogram
+    ):
+        """Histograms of both children, the smaller one is built, the larger is parent minus sibling"""
+        if self.max_bins is None:
+            return None, None
+        if middle - start <= end - middle:
+            left = self.__histogram(X, stats, samples[start:middle])
+            return left, tuple(parent - child for parent, child in zip(histogram, left))
+        right = self.__histogram(X, stats, samples[middle:end])
+        return tuple(parent - child for parent, child in zip(histogram, right)), right
+
+    def __build_tree(
+        self, X: np.ndarray, y: np.ndarray, weight: np.ndarray | None, stats: np.ndarray,
+        samples: np.ndarray, start: int, end: int, depth: int = 0, histogram=None,
+        pool: ThreadPoolExecutor | None = None, seed: np.random.SeedSequence | None = None
+    ):
+        """Grows the subtree of samples[start:end], X holds bin codes if max_bins is set"""
+        if pool is not None and depth == self.parallel_depth:
+            # independent subtrees own disjoint slices of samples
+            return pool.submit(self.__build_tree,
+                X, y, weight, stats, samples, start, end, depth, histogram, seed=seed)
+        _, feature, split, histogram = self.__split(
+            X, y, weight, stats, samples, start, end, depth, histogram, pool, seed)
+        if feature is None:
+            return self.__leaf(y, weight, samples[start:end])
+        middle = self.__partition(X, samples, start, end, feature, split)
+        left_histogram, right_histogram = self.__child_histograms(
+            X, stats, samples, start, middle, end, histogram)
+        # children seeds depend only on the position in the tree, not on build order
+        left_seed, right_seed = (None, None) if seed is None else seed.spawn(2)
+        left_child = self.__build_tree(X, y, weight, stats, samples,
+            start, middle, depth + 1, left_histogram, pool, left_seed)
+        right_child = self.__build_tree(X, y, weight, stats, samples,
+            middle, end, depth + 1, right_histogram, pool, right_seed)
         return Node(feature=feature,
-                    threshold=threshold,
+                    threshold=self.__threshold(feature, split),
                     left_child=left_child,
                     right_child=right_child)
 
-    def fit(self, X: np.ndarray, y: np.ndarray):
-        self.root = self.__build_tree(np.array(X), np.array(y))
+    def __build_best_first(
+        self, X: np.ndarray, y: np.ndarray, weight: np.ndarray | None, stats: np.ndarray,
+        samples: np.ndarray, pool: ThreadPoolExecutor | None = None,
+        seed: np.random.SeedSequence | None = None
+    ) -> Node:
+        """Grows the tree by splitting the leaf of the largest impurity decrease first.
+
+        Open leaves wait in a heap with their best split. Growth stops at
+        max_leaf_nodes leaves, the children of the last split and the leaves
+        left in the heap are not searched any further.
+        """
+        root = Node()
+        heap, order, leaves = [], itertools.count(), 1
+
+        def open_leaf(node: Node, start: int, end: int, depth: int, histogram, seed):
+            decrease, feature, split, histogram = self.__split(
+                X, y, weight, stats, samples, start, end, depth, histogram, pool, seed)
+            if feature is None:
+                node.predicted_value = self.__leaf(y, weight, samples[start:end]).predicted_value
+            else:
+                heapq.heappush(heap, (-decrease, next(order), node, start, end, depth,
+                                      feature, split, histogram, seed))
+
+        open_leaf(root, 0, len(samples), 0, None, seed)
+        while heap:
+            _, _, node, start, end, depth, feature, split, histogram, seed = heapq.heappop(heap)
+            if leaves == self.max_leaf_nodes:
+                node.predicted_value = self.__leaf(y, weight, samples[start:end]).predicted_value
+                continue
+            middle = self.__partition(X, samples, start, end, feature, split)
+            node.feature, node.threshold = feature, self.__threshold(feature, split)
+            node.left_child, node.right_child = Node(), Node()
+            leaves += 1
+            if leaves == self.max_leaf_nodes:
+                for child, child_start, child_end in [
+                    (node.left_child, start, middle), (node.right_child, middle, end)
+                ]:
+                    child.predicted_value = self.__leaf(
+                        y, weight, samples[child_start:child_end]).predicted_value
+                continue
+            left_histogram, right_histogram = self.__child_histograms(
+                X, stats, samples, start, middle, end, histogram)
+            left_seed, right_seed = (None, None) if seed is None else seed.spawn(2)
+            open_leaf(node.left_child, start, middle, depth + 1, left_histogram, left_seed)
+            open_leaf(node.right_child, middle, end, depth + 1, right_histogram, right_seed)
+        return root
+
+    @staticmethod
+    def __gather(node: Node | Future) -> Node:
+        """Replaces subtrees submitted to the pool with the built ones"""
+        if isinstance(node, Future):
+            return node.result()
+        if node.feature is not None:
+            node.left_child = CART.__gather(node.left_child)
+            node.right_child = CART.__gather(node.right_child)
+        return node
+
+    def fit(self, X: np.ndarray, y: np.ndarray, sample_weight: np.ndarray | None = None):
+        """Fits on X and y, arrays of a numeric dtype are used without a copy.
+
+        Besides X the exact path keeps per-sample statistics, one float per class
+        for classification and three for regression, 8 * n * k bytes for n rows
+        and k classes. Every feature scan gathers them over the node's rows and
+        takes their cumulative sum, another 16 * n * k bytes at the root per
+        thread. max_bins keeps the statistics but scans per-bin sums instead,
+        fit_stream keeps neither.
+        """
+        X, y = np.asarray(X), np.asarray(y)
+        if X.dtype.kind not in 'biuf':
+            X = X.astype(float)
+        weight = None if sample_weight is None else np.asarray(sample_weight, dtype=float)
+        if self.max_bins is not None:
+            X = self.__quantize(X)
+        stats = self.__statistics(y, weight)
+        self.__total_weight = len(y) if weight is None else weight.sum()
+        seed = (None if self.max_features is None
+                else np.random.SeedSequence(self.random_state))
+        n_jobs = os.cpu_count() if self.n_jobs == -1 else self.n_jobs
+        with ThreadPoolExecutor(n_jobs) if n_jobs and n_jobs > 1 else nullcontext() as pool:
+            if self.max_leaf_nodes is None:
+                self.root = self.__gather(self.__build_tree(
+                    X, y, weight, stats, np.arange(len(y)), 0, len(y), pool=pool, seed=seed))
+            else:
+                self.root = self.__build_best_first(
+                    X, y, weight, stats, np.arange(len(y)), pool=pool, seed=seed)
+        self.tree = Tree.from_root(self.root)
         return self
 
-    def __predict_single(self, X: np.ndarray, node: Node):
-        while isinstance(node.feature, int):
-            node = node.left_child if X[node.feature] <= node.threshold else node.right_child
-        return node.predicted_value
+    def __stream_leaf(self, sums: np.ndarray, center: float, classes: np.ndarray) -> Node:
+        """Leaf from summed statistics of its samples"""
+        if self.split_cost is squared_error_cost:
+            return Node(center + sums[1] / sums[0])
+        return Node(classes[np.argmax(sums)])
+
+    def __pure(self, sums: np.ndarray) -> bool:
+        """Whether summed statistics of a node hold one class or one target value"""
+        if self.split_cost is squared_error_cost:
+            # sum of squared errors up to the rounding of the summed squares
+            return self.split_cost(sums[None])[0] <= 64 * EPSILON * sums[2]
+        return np.count_nonzero(sums) <= 1
+
+    def fit_stream(
+        self, chunks: Callable[[], Iterable[tuple[np.ndarray, np.ndarray]]],
+        sketch_size: int = 4096
+    ):
+        """Fits on data that does not fit in memory.
+
+        chunks() must yield (X, y) pieces of the dataset anew on every call. The first
+        pass sketches feature quantiles, then the tree grows breadth-first, one pass
+        histogramming all open nodes of a depth. Memory depends on the number of open
+        nodes and bins only, max_bins defaults to 256.
+        """
+        if self.split_cost is None:
+            raise ValueError('Criterion absolute_error not supports fit_stream')
+        elif self.max_leaf_nodes is not None:
+            raise ValueError('max_leaf_nodes not supported by fit_stream, it grows level by level')
+        max_bins = self.max_bins or 256
+        sketches, classes, total, count = None, np.empty(0), 0.0, 0
+        for X, y in chunks():
+            X, y = np.array(X, dtype=float), np.array(y)
+            sketches = sketches or [QuantileSketch(sketch_size) for _ in range(X.shape[1])]
+            for feature, sketch in enumerate(sketches):
+                sketch.update(X[:, feature])
+            count += len(y)
+            if self.split_cost is squared_error_cost:
+                total += y.sum()
+            else:
+                classes = np.union1d(classes, y)
+        if not count:
+            raise ValueError('chunks() yielded no rows to fit on')
+        self.bin_edges = [sketch.edges(max_bins) for sketch in sketches]
+        n_bins = max(len(edges) for edges in self.bin_edges) + 1
+        center = total / count if count else 0.0
+        seed = (None if self.max_features is None
+                else np.random.SeedSequence(self.random_state))
+
+        # routing table of the tree grown so far, open nodes are leaves with a slot
+        self.root = Node()
+        nodes, feature_of, bin_of, left_of, right_of = [self.root], [-1], [0], [0], [0]
+        opened, seeds = [0], [seed]
+        depth = 0
+        while opened:
+            slot_of = np.full(len(nodes), -1)
+            slot_of[opened] = np.arange(len(opened))
+            table = [np.array(column) for column in [feature_of, bin_of, left_of, right_of]]
+            counts = np.zeros((len(opened), len(sketches), n_bins))
+            sums = None
+            for X, y in chunks():
+                codes = self.__bin_codes(np.array(X, dtype=float))
+                stats = self.__statistics(np.array(y), center=center, classes=classes)
+                node = np.zeros(len(codes), dtype=np.intp)
+                for _ in range(depth):
+                    feature, split, left, right = (column[node] for column in table)
+                    goes_left = codes[np.arange(len(codes)), feature] <= split
+                    node = np.where(feature < 0, node, np.where(goes_left, left, right))
+                rows = np.flatnonzero(slot_of[node] >= 0)
+                index = slot_of[node[rows]] * n_bins
+                if sums is None:
+                    sums = np.zeros((len(opened), len(sketches), n_bins, stats.shape[1]))
+                for feature in range(len(sketches)):
+                    column = index + codes[rows, feature]
+                    size = len(opened) * n_bins
+                    counts[:, feature] += np.bincount(
+                        column, minlength=size).reshape(len(opened), n_bins)
+                    for j in range(stats.shape[1]):
+                        sums[:, feature, :, j] += np.bincount(
+                            column, weights=stats[rows, j], minlength=size
+                        ).reshape(len(opened), n_bins)
+            next_opened, next_seeds = [], []
+            for slot, (node_id, node_seed) in enumerate(zip(opened, seeds)):
+                histogram = counts[slot], sums[slot]
+                node_sums = sums[slot, 0].sum(axis=0)
+                feature = None
+                if (depth != self.max_depth and counts[slot, 0].sum() > self.min_samples_split
+                        and not self.__pure(node_sums)):
+                    features = self.__features(len(sketches), node_seed)
+                    feature, split, score = self.__find_best_bin(histogram, features)
+                    cost, scale = self.__node_cost(None, None, None, None, histogram)
+                    if (cost - score * scale) / count + EPSILON < self.min_impurity_decrease:
+                        feature = None
+                if feature is None:
+                    nodes[node_id].predicted_value = self.__stream_leaf(
+                        node_sums, center, classes).predicted_value
+                    continue
+                node = nodes[node_id]
+                node.feature, node.threshold = feature, self.bin_edges[feature][split]
+                left_count = counts[slot, feature, :split + 1].sum()
+                left_sums = sums[slot, feature, :split + 1].sum(axis=0)
+                child_seeds = (None, None) if node_seed is None else node_seed.spawn(2)
+                for child_count, child_sums, child_seed in [
+                    (left_count, left_sums, child_seeds[0]),
+                    (counts[slot, 0].sum() - left_count, node_sums - left_sums, child_seeds[1]),
+                ]:
+                    child_id = len(nodes)
+                    if (depth + 1 == self.max_depth or child_count <= self.min_samples_split
+                            or self.__pure(child_sums)):
+                        nodes.append(self.__stream_leaf(child_sums, center, classes))
+                    else:
+                        nodes.append(Node())
+                        next_opened.append(child_id)
+                        next_seeds.append(child_seed)
+                    feature_of.append(-1)
+                    bin_of.append(0)
+                    left_of.append(0)
+                    right_of.append(0)
+                node.left_child, node.right_child = nodes[-2], nodes[-1]
+                feature_of[node_id], bin_of[node_id] = feature, split
+                left_of[node_id], right_of[node_id] = len(nodes) - 2, len(nodes) - 1
+            opened, seeds = next_opened, next_seeds
+            depth += 1
+        self.tree = Tree.from_root(self.root)
+        return self
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return self.tree.predict(np.array(X))
+
+    def save(self, path: str):
+        criterion = next(name for name, func in CART.CRITERIONS.items()
+                         if func is self.criterion)
+        self.tree.save(path, dict(
+            criterion=criterion,
+            max_depth=self.max_depth,
+            min_samples_split=self.min_samples_split,
+            max_bins=self.max_bins,
+            max_features=self.max_features,
+            random_state=self.random_state,
+            max_leaf_nodes=self.max_leaf_nodes,
+            min_impurity_decrease=self.min_impurity_decrease))
 
-    def predict(self, X: np.ndarray):
-        return [self.__predict_single(x, self.root) for x in np.array(X)]
+    @classmethod
+    def load(cls, path: str, mmap: bool = True):
+        """Fitted model from CART.save, predictions need no Node objects"""
+        cart = cls(**Tree.read_header(path)['metadata'])
+        cart.root = None
+        cart.tree = Tree.load(path, mmap)
+        return cart
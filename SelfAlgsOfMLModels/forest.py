@@ -0,0 +1,125 @@
+from typing import Literal
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import multiprocessing
+import os
+import numpy as np
+from cart import CART
+
+# training data of a worker process, sent once by the pool initializer
+_X: np.ndarray | None = None
+_y: np.ndarray | None = None
+
+def _share(X: np.ndarray, y: np.ndarray | None = None):
+    global _X, _y
+    _X, _y = X, y
+
+def _fit_tree(params: dict, seed: np.random.SeedSequence):
+    """Fits a tree on a bootstrap sample and predicts its out-of-bag rows"""
+    bootstrap_seed, tree_seed = seed.spawn(2)
+    n = len(_y)
+    samples = np.random.default_rng(bootstrap_seed).integers(0, n, n)
+    oob = np.ones(n, dtype=bool)
+    oob[samples] = False
+    oob = np.flatnonzero(oob)
+    random_state = int(tree_seed.generate_state(1)[0])
+    tree = CART(**params, random_state=random_state).fit(_X[samples], _y[samples])
+    return tree, oob, tree.predict(_X[oob])
+
+def _predict_trees(trees: list[CART]) -> list[np.ndarray]:
+    return [tree.predict(_X) for tree in trees]
+
+class CARTForest:
+    """Bagged ensemble of CART trees with per-node feature subsampling"""
+    def __init__(
+        self,
+        criterion: Literal['squared_error', 'absolute_error', 'entropy', 'gini'],
+        n_estimators: int = 100,
+        max_depth: int | None = None,
+        min_samples_split: int = 2,
+        max_features: int | float | Literal['sqrt', 'log2'] | None = 'sqrt',
+        max_bins: int | None = None,
+        max_leaf_nodes: int | None = None,
+        min_impurity_decrease: float = 0.0,
+        oob_score: bool = False,
+        n_jobs: int | None = None,
+        random_state: int | None = None
+    ) -> None:
+        self.criterion = criterion
+        self.n_estimators = n_estimators
+        self.params = dict(
+            criterion=criterion,
+            max_depth=max_depth,
+            min_samples_split=min_samples_split,
+            max_features=max_features,
+            max_bins=max_bins,
+            max_leaf_nodes=max_leaf_nodes,
+            min_impurity_decrease=min_impurity_decrease)
+        CART(**self.params) # validates the tree parameters
+        self.oob_score = oob_score
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+        self.is_regression = criterion in ['squared_error', 'absolute_error']
+        self.trees: list[CART] = []
+
+    def __workers(self) -> int:
+        return os.cpu_count() if self.n_jobs == -1 else self.n_jobs or 1
+
+    def __map(self, func, items: list, X: np.ndarray, y: np.ndarray | None = None):
+        """Applies func to items in worker processes that share X and y"""
+        if self.__workers() == 1:
+            _share(X, y)
+            try:
+                return list(map(func, items))
+            finally:
+                _share(None)
+        # fork would copy the locks of other threads, the app fits from a background thread
+        with ProcessPoolExecutor(self.__workers(), mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_share, initargs=(X, y)) as pool:
+            return list(pool.map(func, items))
+
+    def __aggregate(self, predictions: list[np.ndarray], n: int) -> np.ndarray:
+        """Mean for regression, majority vote for classification"""
+        if self.is_regression:
+            return np.mean(predictions, axis=0)
+        votes = np.zeros((n, len(self.classes)))
+        for prediction in predictions:
+            votes[np.arange(n), np.searchsorted(self.classes, prediction)] += 1
+        return self.classes[np.argmax(votes, axis=1)]
+
+    def __score_oob(self, y: np.ndarray, results: list):
+        if self.is_regression:
+            sums, counts = np.zeros(len(y)), np.zeros(len(y))
+            for _, oob, prediction in results:
+                sums[oob] += prediction
+                counts[oob] += 1
+            with np.errstate(invalid='ignore'):
+                self.oob_prediction_ = sums / counts
+            seen = counts > 0
+            residual = np.sum((y[seen] - self.oob_prediction_[seen])**2)
+            self.oob_score_ = 1 - residual / np.sum((y[seen] - np.mean(y[seen]))**2)
+        else:
+            votes = np.zeros((len(y), len(self.classes)))
+            for _, oob, prediction in results:
+                votes[oob, np.searchsorted(self.classes, prediction)] += 1
+            seen = votes.sum(axis=1) > 0
+            self.oob_prediction_ = self.classes[np.argmax(votes, axis=1)]
+            self.oob_score_ = np.mean(self.oob_prediction_[seen] == y[seen])
+
+    def fit(self, X: np.ndarray, y: np.ndarray):
+        X, y = np.array(X), np.array(y)
+        if not self.is_regression:
+            self.classes = np.unique(y)
+        seeds = np.random.SeedSequence(self.random_state).spawn(self.n_estimators)
+        results = self.__map(partial(_fit_tree, self.params), seeds, X, y)
+        self.trees = [tree for tree, _, _ in results]
+        if self.oob_score:
+            self.__score_oob(y, results)
+        return self
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        X = np.array(X)
+        groups = np.array_split(np.arange(len(self.trees)), self.__workers())
+        batches = [[self.trees[i] for i in group] for group in groups if len(group)]
+        predictions = [p for batch in self.__map(_predict_trees, batches, X) for p in batch]
+        return self.__aggregate(predictions, len(X))
@@ -1,6 +1,6 @@
 import streamlit as st
 import pandas as pd
-from sklearn.model_selection import train_test_split
+from functools import partial
 from sklearn.metrics import (
     classification_report as report,
     mean_squared_error as mse,
@@ -10,7 +10,17 @@ from sklearn.tree import (
     DecisionTreeClassifier as Dtc,
     DecisionTreeRegressor as Dtr
 )
+from sklearn.ensemble import (
+    RandomForestClassifier as Rfc,
+    RandomForestRegressor as Rfr
+)
 from cart import CART
+from forest import CARTForest
+from cache import Dataset, FitCache, LRUCache, content_hash, model_nbytes
+
+# память под разобранные датасеты и обученные модели, общая для всех сессий
+MAX_DATASETS_MB = 256
+MAX_MODELS_MB = 512
 
 st.set_page_config(
     page_title="Model CART",
@@ -19,6 +29,12 @@ st.set_page_config(
 
 session = st.session_state
 
+@st.cache_resource
+def caches() -> tuple[LRUCache, FitCache]:
+    return LRUCache(MAX_DATASETS_MB * 2**20), FitCache(MAX_MODELS_MB * 2**20)
+
+datasets, models = caches()
+
 st.header('🌲Model CART🌲', divider='rainbow')
 st.subheader('Classification And Regression Tree')
 
@@ -30,29 +46,31 @@ st.file_uploader(
     label_visibility='collapsed'
 )
 
-if session['file'] and 'df' not in session:
-    session['df'] = pd.read_csv(session['file'])
+if session['file'] and session.get('file_id') != session['file'].file_id:
+    data = session['file'].getvalue()
+    session['file_id'] = session['file'].file_id
+    session['file_hash'] = content_hash(data)
+    dataset = datasets.get(session['file_hash'])
+    if dataset is None:
+        dataset = Dataset.read_csv(data)
+        # датасет больше лимита не кэшируется, но остаётся в сессии
+        datasets.put(session['file_hash'], dataset, dataset.nbytes)
+    session['dataset'] = dataset
 elif not session['file']:
     session.clear()
 
 # Выбор признаков #
-if 'df' in session:
+if 'dataset' in session:
     st.subheader(':blue[2. Выберите целевую переменную]')
     target = st.selectbox(
         label='Target',
-        options=[None] + session.df.columns.tolist(),
+        options=[None] + session['dataset'].names,
         key='target',
         label_visibility='collapsed'
     )
 
-# разделение на тренировочную и тестовую выборку #
-if 'target' in session and session['target']:
-    session['x'] = session['df'].drop(
-        session['target'], axis=1)
-    session['y'] = session['df'][session['target']]
-
 # Настройки модели #
-if 'x' in session:
+if session.get('target'):
     st.subheader(':blue[3. Настройте модель]')
 
     criterion = st.selectbox(
@@ -86,29 +104,73 @@ if 'x' in session:
     except Exception as e:
         min_samples_split = 2
 
-    session['cart'] = CART(
+    st.checkbox(
+        label='Случайный лес (бэггинг деревьев)',
+        key='is_forest')
+
+    n_estimators = None
+    if session['is_forest']:
+        st.text_input(
+            label='Количество деревьев:',
+            key='n_estimators',
+            placeholder='По умолчанию: 100')
+        try:
+            n_estimators = int(session['n_estimators'])
+        except ValueError as e:
+            n_estimators = 100
+
+    params = dict(
         criterion=criterion,
         max_depth=max_depth,
         min_samples_split=min_samples_split)
+    # обученные модели запоминаются по содержимому файла и параметрам
+    session['fit_settings'] = (
+        session['file_hash'], session['target'], session['is_forest'],
+        n_estimators, *params.values())
 
-    if session['is_regression']:
-        session['sklearn_model'] = Dtr(
-            criterion=criterion,
-            max_depth=max_depth,
-            min_samples_split=min_samples_split
-            )
-    else:
-        session['sklearn_model'] = Dtc(
-            criterion=criterion,
-            max_depth=max_depth,
-            min_samples_split=min_samples_split
-            )
+    def start_fit(key: tuple):
+        session['fit_key'] = key
+        session.pop('fit', None)
 
     st.button(
         label='Далее',
         key='model_settings',
+        on_click=start_fit,
+        args=(session['fit_settings'],),
         use_container_width=True)
 
+def make_models(params: dict, is_forest: bool, n_estimators: int | None):
+    is_regression = params['criterion'] in ['squared_error', 'absolute_error']
+    if is_forest:
+        sklearn_forest = Rfr if is_regression else Rfc
+        # sklearn regression forests default to all features, CARTForest to sqrt
+        forest_params = dict(params, n_estimators=n_estimators, max_features='sqrt',
+                             oob_score=True, n_jobs=-1, random_state=42)
+        return CARTForest(**forest_params), sklearn_forest(**forest_params)
+    sklearn_tree = Dtr if is_regression else Dtc
+    return CART(**params), sklearn_tree(**params)
+
+def fit_models(dataset: Dataset, target: str, params: dict,
+               is_forest: bool, n_estimators: int | None):
+    """Fits CART and sklearn on the train split, runs in a background thread"""
+    x, y = dataset.features(target), dataset.columns[target]
+    train, test = dataset.split(test_size=0.2, random_state=42)
+    result, nbytes = dict(y_test=y[test]), 0
+    for name, model in zip(['cart', 'sklearn_model'], make_models(params, is_forest, n_estimators)):
+        model.fit(x[train], y[train])
+        result[name] = model
+        result[f'{name}_predict'] = model.predict(x[test])
+        result[f'{name}_oob'] = getattr(model, 'oob_score_', None)
+        nbytes += model_nbytes(model) + result[f'{name}_predict'].nbytes
+    return result, nbytes
+
+@st.fragment(run_every=1)
+def wait_for_fit(future):
+    """Polls the background fit without blocking the rest of the page"""
+    if future.done():
+        st.rerun()
+    st.info('Модель обучается...', icon='⏳')
+
 def metrics(y_test, predict):
     if session['is_regression']:
         st.subheader(f'MSE: {mse(y_test, predict).round(3): _}')
@@ -117,22 +179,26 @@ def metrics(y_test, predict):
         st.write(pd.DataFrame(report(y_test, predict, output_dict=True)))
 
 # обучение модели и результаты #
-if 'model_settings' in session and session['model_settings']:
+if session.get('target') and session.get('fit_key') == session['fit_settings']:
     st.subheader(':blue[4. Результаты]')
-    x_tr, x_test, y_tr, y_test = train_test_split(
-        session['x'],
-        session['y'],
-        test_size=0.2,
-        random_state=42)
-
-    with st.spinner('Модель обучается...'):
-        session['cart'].fit(x_tr, y_tr)
-
-    predict = session['cart'].predict(x_test)
-    metrics(y_test, predict)
+    # сессия держит свой результат, даже если кэш его вытеснил или не принял
+    if session.get('fit', (None,))[0] != session['fit_key']:
+        session['fit'] = session['fit_key'], models.submit(session['fit_key'], partial(
+            fit_models, session['dataset'], session['target'], params,
+            session['is_forest'], n_estimators))
+    future = session['fit'][1]
+    if not future.done():
+        wait_for_fit(future)
+    elif future.exception() is not None:
+        st.error(f'⛔️Ошибка обучения: {future.exception()}')
+    else:
+        result = future.result()
+        metrics(result['y_test'], result['cart_predict'])
+        if session['is_forest']:
+            st.subheader(f'OOB score: {round(result["cart_oob"], 3)}')
 
-    st.subheader(':blue[5. Сравнение с sklearn]')
+        st.subheader(':blue[5. Сравнение с sklearn]')
 
-    session['sklearn_model'].fit(x_tr, y_tr)
-    predict = session['sklearn_model'].predict(x_test)
-    metrics(y_test, predict)
+        metrics(result['y_test'], result['sklearn_model_predict'])
+        if session['is_forest']:
+            st.subheader(f'OOB score: {round(result["sklearn_model_oob"], 3)}')
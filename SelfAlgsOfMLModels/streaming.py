@@ -0,0 +1,9 @@
+"""Chunked CSV sources for CART.fit_stream"""
+import pandas as pd
+
+def csv_chunks(path: str, target: str, chunksize: int = 100_000):
+    """Callable reading the CSV anew on every call as (X, y) chunks"""
+    def chunks():
+        for frame in pd.read_csv(path, chunksize=chunksize):
+            yield frame.drop(columns=target).to_numpy(dtype=float), frame[target].to_numpy()
+    return chunks
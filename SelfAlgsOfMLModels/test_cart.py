@@ -0,0 +1,89 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from cart import CART, gini
+
+DATASETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Datasets')
+
+def dataset(criterion: str, rows: int = 500, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(rows, 5))
+    if criterion in ['squared_error', 'absolute_error']:
+        return X, X @ rng.normal(size=5) + rng.normal(size=rows)
+    return X, np.argmax(X[:, :3] + rng.normal(size=(rows, 3)), axis=1)
+
+def mobile_classif():
+    frame = pd.read_csv(os.path.join(DATASETS_DIR, 'MobileClassif.csv'))
+    return frame.drop(columns='price_range').to_numpy(), frame['price_range'].to_numpy()
+
+@pytest.mark.parametrize('weighted', [False, True])
+@pytest.mark.parametrize('criterion', ['gini', 'entropy'])
+def test_predictions_match_sklearn(criterion, weighted):
+    from sklearn.tree import DecisionTreeClassifier
+    X, y = mobile_classif()
+    weight = np.random.default_rng(0).integers(1, 4, len(y)).astype(float) if weighted else None
+    # deeper leaves hold tied classes, which sklearn and CART break differently
+    cart = CART(criterion, max_depth=5).fit(X, y, sample_weight=weight)
+    tree = DecisionTreeClassifier(criterion=criterion, max_depth=5, random_state=0)
+    tree.fit(X, y, sample_weight=weight)
+    # thresholds differ: CART splits at the left value, sklearn halfway to the right one
+    assert np.array_equal(cart.tree.feature, np.maximum(tree.tree_.feature, -1))
+    assert np.array_equal(cart.predict(X), tree.predict(X))
+
+@pytest.mark.parametrize('weighted', [False, True])
+def test_gini_is_one_minus_squared_shares(weighted):
+    _, y = mobile_classif()
+    weight = np.random.default_rng(0).random(len(y)) if weighted else None
+    shares = np.array([np.sum(y == label) if weight is None else weight[y == label].sum()
+                       for label in np.unique(y)])
+    shares = shares / shares.sum()
+    assert np.isclose(gini(y, weight), 1 - np.sum(shares**2))
+    assert gini(np.zeros(10)) == 0
+
+@pytest.mark.parametrize('mmap', [True, False])
+@pytest.mark.parametrize('criterion', list(CART.CRITERIONS))
+def test_save_load_predictions_identical(tmp_path, criterion, mmap):
+    X, y = dataset(criterion)
+    cart = CART(criterion, max_depth=6).fit(X, y)
+    path = str(tmp_path / 'cart.bin')
+    cart.save(path)
+    loaded = CART.load(path, mmap=mmap)
+    assert np.array_equal(loaded.predict(X), cart.predict(X))
+    assert loaded.max_depth == cart.max_depth
+
+def test_save_load_single_leaf(tmp_path):
+    X, y = dataset('gini')
+    cart = CART('gini', max_depth=0).fit(X, y)
+    path = str(tmp_path / 'leaf.bin')
+    cart.save(path)
+    assert np.array_equal(CART.load(path).predict(X), cart.predict(X))
+
+@pytest.mark.parametrize('criterion', ['squared_error', 'gini', 'entropy'])
+def test_fit_stream_matches_binned_fit(criterion):
+    X, y = dataset(criterion, rows=2000)
+    X = np.round(X * 5)  # few distinct values, so the sketch and the quantiles are exact
+    chunks = lambda: ((X[start:start + 500], y[start:start + 500]) for start in range(0, len(y), 500))
+    # deep nodes of a few rows tie up to the order of summation
+    streamed = CART(criterion, max_depth=6, max_bins=64).fit_stream(chunks)
+    fitted = CART(criterion, max_depth=6, max_bins=64).fit(X, y)
+    # same splits; leaves holding tied classes may break the tie differently
+    assert np.array_equal(streamed.tree.feature, fitted.tree.feature)
+    assert np.allclose(streamed.tree.threshold, fitted.tree.threshold, equal_nan=True)
+    if criterion == 'squared_error':
+        assert np.allclose(streamed.predict(X), fitted.predict(X))
+
+def test_fit_stream_stops_at_pure_nodes():
+    X, _ = dataset('gini', rows=4000)
+    y = (X[:, 0] > 0).astype(int)
+    passes = []
+    def chunks():
+        passes.append(1)
+        yield X, y
+    streamed = CART('gini', max_bins=64).fit_stream(chunks)
+    assert streamed.tree.depth == CART('gini', max_bins=64).fit(X, y).tree.depth
+    assert len(passes) <= streamed.tree.depth + 2
+
+def test_fit_stream_rejects_empty_chunks():
+    with pytest.raises(ValueError):
+        CART('gini').fit_stream(lambda: iter([]))